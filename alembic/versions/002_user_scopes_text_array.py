@@ -0,0 +1,31 @@
+"""Store user scopes as a native text array
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-15 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # ALTER COLUMN ... USING can't contain a subquery, so copy through a new column
+    op.add_column('users', sa.Column('scopes_arr', postgresql.ARRAY(sa.String()), nullable=True))
+    op.execute("UPDATE users SET scopes_arr = ARRAY(SELECT json_array_elements_text(scopes))")
+    op.drop_column('users', 'scopes')
+    op.alter_column('users', 'scopes_arr', new_column_name='scopes', nullable=False)
+
+
+def downgrade() -> None:
+    op.add_column('users', sa.Column('scopes_json', postgresql.JSON(astext_type=sa.Text()), nullable=True))
+    op.execute("UPDATE users SET scopes_json = to_json(scopes)")
+    op.drop_column('users', 'scopes')
+    op.alter_column('users', 'scopes_json', new_column_name='scopes', nullable=False)
@@ -1,4 +1,6 @@
 """Configuration management for the application."""
+from functools import cached_property
+from urllib.parse import urlparse, urlsplit, urlunsplit, unquote
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import List
 
@@ -32,6 +34,10 @@ class Settings(BaseSettings):
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 1440
     
+    # Password hashing - bcrypt cost for new hashes (never below 12); run
+    # `python -m app.utils.db_utils calibrate` to pick a value for this host
+    bcrypt_rounds: int = 12
+    
     # Admin User
     admin_username: str = "admin"
     admin_password: str = "change-this-password"
@@ -54,6 +60,31 @@ class Settings(BaseSettings):
     def cookie_secure(self) -> bool:
         """Determine if cookies should be secure (HTTPS only)."""
         return self.is_production
+    
+    @cached_property
+    def agno_dsn_parts(self) -> dict:
+        """Connection parameters for asyncpg parsed once from AGNO_DB_URL.
+        
+        Percent-encoded credentials (e.g. '%40' for '@') are decoded. Parsed
+        from the normalized URL so a scheme-less value (user:pass@host/db) works.
+        """
+        parsed = urlparse(self.agno_async_db_url)
+        return {
+            "user": unquote(parsed.username or ""),
+            "password": unquote(parsed.password or ""),
+            "host": parsed.hostname or "localhost",
+            "port": parsed.port or 5432,
+            "database": parsed.path.lstrip("/"),
+        }
+    
+    @cached_property
+    def agno_async_db_url(self) -> str:
+        """AGNO_DB_URL normalized once to the SQLAlchemy asyncpg driver (postgresql+asyncpg://)."""
+        if "://" not in self.agno_db_url:
+            # No protocol, assume it's just the connection part
+            return f"postgresql+asyncpg://{self.agno_db_url}"
+        # Any scheme (postgresql, postgresql+psycopg, ...) maps to the async driver
+        return urlunsplit(urlsplit(self.agno_db_url)._replace(scheme="postgresql+asyncpg"))
 
 
 # Global settings instance
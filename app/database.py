@@ -8,6 +8,11 @@ from app.config import settings
 engine = create_engine(
     settings.db_url,
     pool_pre_ping=True,
+    pool_size=20,  # Sync routes/threadpool work can hold many connections at once
+    max_overflow=10,
+    pool_timeout=5,  # Fail fast instead of queueing requests behind a starved pool
+    pool_recycle=1800,  # Replace connections before server/proxy idle timeouts
+    query_cache_size=1200,  # Compiled SQL cache (default 500)
     echo=False  # Set to True for SQL query logging
 )
 
@@ -20,8 +25,5 @@ Base = declarative_base()
 
 def get_db():
     """Dependency for getting database session."""
-    db = SessionLocal()
-    try:
+    with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
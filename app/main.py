@@ -1,51 +1,114 @@
 """FastAPI application initialization."""
 from contextlib import asynccontextmanager
+import asyncio
 import logging
+import logging.handlers
+import queue
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers import auth, pages, chat, admin
 from app.utils.seed import ensure_admin_user
+from app.utils.file_handler import ensure_uploads_dir, shutdown_preview_pool
+from app.services.agno_service import get_agno_pool, close_agno_pool, ensure_session_indexes
 from app.config import settings
 
 # Configure logging
+# Records are handed to a queue and written by a background thread, so log I/O
+# never blocks the event loop
+_log_queue = queue.SimpleQueue()
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+_queue_handler = logging.handlers.QueueHandler(_log_queue)
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))  # Final formatting happens in the listener
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    handlers=[_queue_handler]
 )
+_log_listener.start()
 logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage application lifespan events."""
-    # Startup logic
-    try:
-        logger.info("Starting application initialization...")
-        logger.info("Ensuring admin user exists and database is pruned...")
-        ensure_admin_user()
-        logger.info("Application initialization completed successfully")
-    except Exception as e:
-        logger.error(f"Failed to initialize admin user: {str(e)}", exc_info=True)
-        # Don't raise - allow app to start even if admin creation fails
-        # (might be due to DB connection issues that will resolve)
+    # Startup logic - independent initialization steps run concurrently
+    async def _init_admin_user():
+        try:
+            logger.info("Starting application initialization...")
+            logger.info("Ensuring admin user exists and matches .env settings...")
+            # Sync DB + bcrypt work - keep it off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, ensure_admin_user)
+            logger.info("Application initialization completed successfully")
+        except Exception as e:
+            logger.error(f"Failed to initialize admin user: {str(e)}", exc_info=True)
+            # Don't raise - allow app to start even if admin creation fails
+            # (might be due to DB connection issues that will resolve)
+    
+    async def _init_agno_pool():
+        # Shared connection pool for the Agno database (stats/sessions queries)
+        try:
+            await get_agno_pool()
+        except Exception as e:
+            logger.warning(f"Failed to create Agno database pool (will retry lazily): {str(e)}")
+            return
+        # Index builds can take a long time on a big table - don't hold up startup
+        app.state.session_index_task = asyncio.create_task(ensure_session_indexes())
+    
+    # Uploads are streamed straight into this directory; create it once here
+    ensure_uploads_dir()
+    
+    await asyncio.gather(_init_admin_user(), _init_agno_pool())
+    
     yield
-    # Shutdown logic (if needed)
+    
+    # Shutdown logic
+    index_task = getattr(app.state, "session_index_task", None)
+    if index_task is not None and not index_task.done():
+        # An interrupted build leaves an INVALID index; the next startup rebuilds it
+        index_task.cancel()
+        await asyncio.gather(index_task, return_exceptions=True)
+    await close_agno_pool()
+    shutdown_preview_pool()
+    _log_listener.stop()  # Flush queued log records
 
 
 app = FastAPI(
     title="Cognito - Cognitive Memory Application",
     description="Production-ready cognitive memory application with FastAPI, Cognee, and Agno",
     version="0.1.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse  # Rust-backed JSON encoding, native datetime support
 )
 
+# Allowed CORS origins (set membership instead of a list scan)
+CORS_ORIGINS = frozenset({"http://localhost:8000", "http://127.0.0.1:8000"})  # Add production origins in production
+
+
+class APICORSMiddleware:
+    """Apply CORS only to API paths; static files and pages bypass it entirely."""
+
+    def __init__(self, app, prefix: str = "/api", **cors_options):
+        self.app = app
+        self.cors_app = CORSMiddleware(app, **cors_options)
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(self.prefix):
+            await self.cors_app(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+
 # Configure CORS - essential for cookie-based authentication
 # Even for same-origin, this ensures credentials are handled correctly
 app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:8000", "http://127.0.0.1:8000"],  # Add production origins in production
+    APICORSMiddleware,
+    prefix="/api",
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,  # Critical for cookies to work
     allow_methods=["*"],
     allow_headers=["*"],
@@ -1,5 +1,7 @@
 """SQLAlchemy models for the application."""
-from sqlalchemy import Column, Integer, String, Boolean, JSON, DateTime
+from functools import cached_property
+from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -12,10 +14,15 @@ class User(Base):
     username = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean, default=False, nullable=False)
-    scopes = Column(JSON, nullable=False)  # Array of scopes: ['admin'] or ['user']
+    scopes = Column(ARRAY(String), nullable=False)  # Native text[] of scopes: ['admin'] or ['user']
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
+    @cached_property
+    def scope_set(self) -> frozenset:
+        """Scopes as a frozenset for O(1) membership checks (computed once per instance)."""
+        return frozenset(self.scopes or ())
+    
     def __repr__(self):
         return f"<User(id={self.id}, username={self.username}, scopes={self.scopes}, is_active={self.is_active})>"
 
@@ -1,17 +1,22 @@
 """Admin routes for knowledge management and user administration."""
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Request
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Request, Response, Query
 from fastapi.security import SecurityScopes
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, func, update
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from pydantic import BaseModel
 from app.database import get_db
 from app.models import User
 from app.schemas import StatsResponse
-from app.security.dependencies import require_scope, get_current_user, require_scopes
-from app.services.cognee_service import get_cognee_service
-from app.services.agno_service import get_agno_service
-from app.utils.file_handler import validate_file, save_uploaded_file, get_file_preview
-import os
+from app.security.dependencies import require_scope, get_current_user, require_scopes, invalidate_user_cache
+from app.services.cognee_service import CogneeService, get_cognee_service
+from app.services.agno_service import get_agno_pool, count_conversations
+from app.services.dataset_cache import get_classified, paginate
+from app.utils.file_handler import validate_file, save_uploaded_file, get_uploaded_file_preview
+import asyncio
+import hashlib
+import time
 import aiofiles
 import logging
 from app.config import settings
@@ -27,60 +32,139 @@ class URLRequest(BaseModel):
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
+# Shared admin-scope dependency for every route in this module
+AdminUser = Depends(require_scope("admin"))
 
-@router.get("/stats", response_model=StatsResponse)
-async def get_stats(
-    current_user: User = Depends(require_scope("admin")),
-    db: Session = Depends(get_db)
-):
-    """Get statistics for admin dashboard."""
-    # Count users
-    total_users = db.query(User).count()
-    
-    # Count conversations from Agno database via service
-    total_conversations = 0
+# How long stats are reused in-process before recomputing
+STATS_MAX_AGE = 30
+
+# Last computed stats (serialized JSON) and their ETag, shared by all admins until they expire
+_stats_cache: Dict[str, Any] = {"value": None, "etag": None, "expires": 0.0}
+_stats_lock = asyncio.Lock()
+
+
+def invalidate_stats_cache() -> None:
+    """Force the next stats request to recompute (call after changing users/data)."""
+    _stats_cache["expires"] = 0.0
+
+
+# Seconds the serialized user list is reused; register/activate invalidate it sooner
+USERS_CACHE_TTL = 60
+
+_users_cache: Dict[str, Any] = {"value": None, "expires": 0.0}
+
+
+def invalidate_users_cache() -> None:
+    """Force the next user list request to re-query (call after adding/changing users)."""
+    _users_cache["expires"] = 0.0
+
+
+async def cognee_dep() -> CogneeService:
+    """Dependency providing the Cognee service (503 if it cannot be initialized)."""
+    # async so FastAPI resolves it on the event loop - a sync dependency would
+    # cost a threadpool hop per request just to return the cached singleton
     try:
-        agno_service = get_agno_service()
-        total_conversations = await agno_service.get_conversation_stats()
+        return get_cognee_service()
     except Exception as e:
-        logger.warning(f"Failed to count conversations: {str(e)}")
-        total_conversations = 0
-    
-    # Count files and URLs from Cognee datasets via service
-    total_files = 0
-    total_urls = 0
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Cognee service unavailable: {str(e)}"
+        )
+
+
+async def optional_cognee_dep() -> Optional[CogneeService]:
+    """Dependency providing the Cognee service, or None if it cannot be initialized."""
     try:
-        try:
-            cognee_service = get_cognee_service()
-        except Exception as e:
-            # If Cognee service is not available, skip file/URL counting
-            logger.warning(f"Cognee service unavailable: {str(e)}")
-            cognee_service = None
-        
-        if cognee_service:
-            # use list_files and list_urls which do the parsing for us
-            files = await cognee_service.list_files("default")
-            urls = await cognee_service.list_urls("default")
-            total_files = len(files)
-            total_urls = len(urls)
-            
+        return get_cognee_service()
+    except Exception as e:
+        logger.warning("Cognee service unavailable: %s", e)
+        return None
+
+
+async def _count_convos(exact: bool = False) -> int:
+    """Count conversations from Agno database via service (0 if unavailable)."""
+    try:
+        # Straight from the pooled Agno database - doesn't need the Agno SDK
+        return await count_conversations(await get_agno_pool(), exact)
+    except Exception as e:
+        logger.warning("Failed to count conversations: %s", e)
+        return 0
+
+
+async def _count_dataset() -> Tuple[int, int]:
+    """Count files and URLs in the default dataset ((0, 0) if unavailable)."""
+    try:
+        # One classified pass over the dataset, shared with the files/URLs tabs
+        cognee_service = get_cognee_service()
+        view = await get_classified(cognee_service, "default")
+        return view.n_files, view.n_urls
     except Exception as e:
-        # If counting fails, log but don't fail the request
-        logger.warning(f"Failed to count files/URLs: {str(e)}")
+        # If counting fails (e.g. Cognee unavailable), log but don't fail the request
+        logger.warning("Failed to count files/URLs: %s", e)
+        return 0, 0
+
+
+async def _compute_stats(db: Session, exact: bool = False) -> Tuple[str, str]:
+    """Compute dashboard stats as a JSON body, plus its ETag."""
+    # The counts are independent, so run them concurrently. The user count
+    # comes from our own database (sync session, so in the threadpool) and its
+    # failures propagate; the external services degrade to 0.
+    total_users, total_conversations, (total_files, total_urls) = await asyncio.gather(
+        run_in_threadpool(lambda: db.execute(select(func.count(User.id))).scalar()),
+        _count_convos(exact),
+        _count_dataset()
+    )
     
-    return StatsResponse(
+    # Server-computed ints - skip input validation
+    stats = StatsResponse.model_construct(
         total_users=total_users,
         total_conversations=total_conversations,
         total_files=total_files,
         total_urls=total_urls
     )
+    etag = '"%s"' % hashlib.blake2b(
+        f"{total_users}:{total_conversations}:{total_files}:{total_urls}".encode(),
+        digest_size=8
+    ).hexdigest()
+    # Serialize once; cache hits then send these bytes without re-encoding
+    return stats.model_dump_json(), etag
+
+
+@router.get("/stats", response_model=StatsResponse)
+async def get_stats(
+    request: Request,
+    exact: bool = Query(False, description="Exact conversation count instead of the cached estimate"),
+    current_user: User = AdminUser,
+    db: Session = Depends(get_db)
+):
+    """Get statistics for admin dashboard."""
+    if exact:
+        # Explicit request for exact numbers - bypass (and don't pollute) the cache
+        body, etag = await _compute_stats(db, exact=True)
+    else:
+        if time.monotonic() >= _stats_cache["expires"]:
+            async with _stats_lock:
+                # Another request may have refreshed the cache while we waited
+                if time.monotonic() >= _stats_cache["expires"]:
+                    _stats_cache["value"], _stats_cache["etag"] = await _compute_stats(db)
+                    _stats_cache["expires"] = time.monotonic() + STATS_MAX_AGE
+        body, etag = _stats_cache["value"], _stats_cache["etag"]
+    
+    # The dashboard polls this endpoint (and reloads it right after each change):
+    # no-cache makes every poll revalidate against the counters, answered by a 304
+    cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+    
+    return Response(content=body, media_type="application/json", headers=cache_headers)
 
 
 @router.post("/files/upload")
 async def upload_file(
     file: UploadFile = File(...),
     dataset_name: str = "default",
-    current_user: User = Depends(require_scope("admin"))
+    current_user: User = AdminUser,
+    cognee_service: CogneeService = Depends(cognee_dep)
 ):
     """Upload a file for processing."""
     # Validate file type
@@ -94,14 +178,6 @@ async def upload_file(
     file_path = await save_uploaded_file(file)
     
     # Add file to Cognee
-    try:
-        cognee_service = get_cognee_service()
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=f"Cognee service unavailable: {str(e)}"
-        )
-    
     result = await cognee_service.add_file(dataset_name, file_path)
     
     if result["status"] == "error":
@@ -110,6 +186,7 @@ async def upload_file(
             detail=f"Failed to add file to Cognee: {result.get('error', 'Unknown error')}"
         )
     
+    invalidate_stats_cache()
     return {
         "message": "File uploaded successfully",
         "file_path": file_path,
@@ -120,60 +197,34 @@ async def upload_file(
 @router.get("/files")
 async def list_files(
     dataset_name: str = "default",
-    current_user: User = Depends(require_scope("admin"))
+    limit: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    current_user: User = AdminUser,
+    cognee_service: CogneeService = Depends(cognee_dep)
 ):
-    """List all files in a dataset."""
-    try:
-        cognee_service = get_cognee_service()
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=f"Cognee service unavailable: {str(e)}"
-        )
-    
-    files = await cognee_service.list_files(dataset_name)
-    return {"files": files}
+    """List files in a dataset (optionally paged with limit/offset)."""
+    view = await get_classified(cognee_service, dataset_name)
+    return {"files": paginate(view.files, limit, offset), "total": view.n_files}
 
 
 @router.get("/files/{file_id}/preview")
 async def preview_file(
     file_id: str,
     dataset_name: str = "default",
-    current_user: User = Depends(require_scope("admin"))
+    current_user: User = AdminUser,
+    cognee_service: Optional[CogneeService] = Depends(optional_cognee_dep)
 ):
     """Preview file content."""
     try:
-        try:
-            cognee_service = get_cognee_service()
-        except Exception as e:
-            # Fallback to local file if Cognee is unavailable
-            cognee_service = None
-            logger.warning(f"Cognee service unavailable for preview: {str(e)}")
-        
-        preview = None
-        if cognee_service:
+        if cognee_service is not None:
+            # The service already falls back to the uploads directory itself
             preview = await cognee_service.get_file_preview(file_id, dataset_name)
-        
-        # Fallback if service returned None (and service was available but couldn't find/read it)
-        # However, the service method already handles the local fallback logic too! 
-        # So if it returns None, it really is not found.
-        # But wait, if cognee_service was None (exception), we need manual fallback here?
-        # The service method uses imports that might fail if we can't get the service instance?
-        # Actually `get_cognee_service` might raise.
+        else:
+            # Cognee unavailable - serve straight from the uploads directory
+            preview = await asyncio.to_thread(get_uploaded_file_preview, file_id)
         
         if preview:
             return {"preview": preview}
-            
-        # If we are here, either service failed or returned None.
-        # If service failed (cognee_service is None), we should try manual fallback.
-        if cognee_service is None:
-             # Fallback: Check if file exists in uploads directory
-            uploads_dir = "app/static/uploads"
-            file_path = os.path.join(uploads_dir, file_id)
-            if os.path.exists(file_path):
-                 # We need to import get_file_preview from utils again locally or use the one imported at top
-                 from app.utils.file_handler import get_file_preview as get_local_preview
-                 return {"preview": get_local_preview(file_path)}
         
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -182,7 +233,7 @@ async def preview_file(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error previewing file: {str(e)}", exc_info=True)
+        logger.error("Error previewing file: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error previewing file: {str(e)}"
@@ -193,17 +244,10 @@ async def preview_file(
 async def delete_file(
     file_id: str,
     dataset_name: str = "default",
-    current_user: User = Depends(require_scope("admin"))
+    current_user: User = AdminUser,
+    cognee_service: CogneeService = Depends(cognee_dep)
 ):
     """Delete a file from dataset."""
-    try:
-        cognee_service = get_cognee_service()
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=f"Cognee service unavailable: {str(e)}"
-        )
-    
     result = await cognee_service.delete_data(dataset_name, file_id)
     
     if result["status"] == "error":
@@ -212,6 +256,7 @@ async def delete_file(
             detail=f"Failed to delete file: {result.get('error', 'Unknown error')}"
         )
     
+    invalidate_stats_cache()
     return {"message": "File deleted successfully"}
 
 
@@ -219,17 +264,10 @@ async def delete_file(
 async def process_file(
     file_id: str,
     dataset_name: str = "default",
-    current_user: User = Depends(require_scope("admin"))
+    current_user: User = AdminUser,
+    cognee_service: CogneeService = Depends(cognee_dep)
 ):
     """Process a file (cognify)."""
-    try:
-        cognee_service = get_cognee_service()
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=f"Cognee service unavailable: {str(e)}"
-        )
-    
     result = await cognee_service.cognify(dataset_name)
     
     if result["status"] == "error":
@@ -244,17 +282,10 @@ async def process_file(
 @router.post("/urls")
 async def add_url(
     url_request: URLRequest,
-    current_user: User = Depends(require_scope("admin"))
+    current_user: User = AdminUser,
+    cognee_service: CogneeService = Depends(cognee_dep)
 ):
     """Add a URL to dataset."""
-    try:
-        cognee_service = get_cognee_service()
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=f"Cognee service unavailable: {str(e)}"
-        )
-    
     result = await cognee_service.add_url(url_request.dataset_name, url_request.url)
     
     if result["status"] == "error":
@@ -263,67 +294,49 @@ async def add_url(
             detail=f"Failed to add URL: {result.get('error', 'Unknown error')}"
         )
     
+    invalidate_stats_cache()
     return {"message": "URL added successfully", "dataset_name": url_request.dataset_name}
 
 
 @router.get("/urls")
 async def list_urls(
     dataset_name: str = "default",
-    current_user: User = Depends(require_scope("admin"))
+    limit: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    current_user: User = AdminUser,
+    cognee_service: CogneeService = Depends(cognee_dep)
 ):
-    """List all URLs in a dataset."""
-    try:
-        cognee_service = get_cognee_service()
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=f"Cognee service unavailable: {str(e)}"
-        )
-        
-    urls = await cognee_service.list_urls(dataset_name)
-    return {"urls": urls}
+    """List URLs in a dataset (optionally paged with limit/offset)."""
+    view = await get_classified(cognee_service, dataset_name)
+    return {"urls": paginate(view.urls, limit, offset), "total": view.n_urls}
 
 
 @router.get("/urls/{url_id}/preview")
 async def preview_url(
     url_id: str,
-    current_user: User = Depends(require_scope("admin"))
+    current_user: User = AdminUser,
+    cognee_service: CogneeService = Depends(cognee_dep)
 ):
     """Preview URL (fetch metadata)."""
     try:
-        try:
-            cognee_service = get_cognee_service()
-        except Exception as e:
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail=f"Cognee service unavailable: {str(e)}"
-            )
+        view = await get_classified(cognee_service, "default")
         
-        # We can implement get_url_preview in service too, but for now we'll do it here or add it to service?
-        # The plan said "get_preview" in service, but I implemented `get_file_preview`.
-        # Reuse logic:
-        result = await cognee_service.get_dataset_data("default")
-        
-        if result["status"] == "success" and result.get("data"):
-            dataset_data = result["data"]
-            if isinstance(dataset_data, list):
-                for item in dataset_data:
-                    item_id = str(item.get("id", "")) if isinstance(item, dict) else str(item)
-                    if item_id == url_id:
-                        if isinstance(item, dict):
-                            url = item.get("url") or item.get("link") or item.get("data", "")
-                        elif isinstance(item, str):
-                            url = item
-                        else:
-                            url = str(item)
-                        
-                        return {
-                            "preview": f"URL: {url}\n\nMetadata: {item if isinstance(item, dict) else 'No additional metadata available'}"
-                        }
+        item = view.get_item(url_id)
+        if item is not None:
+            if isinstance(item, dict):
+                url = item.get("url") or item.get("link") or item.get("data", "")
+            elif isinstance(item, str):
+                url = item
+            else:
+                url = str(item)
+            
+            return {
+                "preview": f"URL: {url}\n\nMetadata: {item if isinstance(item, dict) else 'No additional metadata available'}"
+            }
         
         return {"preview": "URL not found in dataset"}
     except Exception as e:
-        logger.error(f"Error fetching URL preview: {str(e)}", exc_info=True)
+        logger.error("Error fetching URL preview: %s", e, exc_info=True)
         return {"preview": f"Error fetching URL preview: {str(e)}"}
 
 
@@ -331,17 +344,10 @@ async def preview_url(
 async def delete_url(
     url_id: str,
     dataset_name: str = "default",
-    current_user: User = Depends(require_scope("admin"))
+    current_user: User = AdminUser,
+    cognee_service: CogneeService = Depends(cognee_dep)
 ):
     """Delete a URL from dataset."""
-    try:
-        cognee_service = get_cognee_service()
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=f"Cognee service unavailable: {str(e)}"
-        )
-
     result = await cognee_service.delete_data(dataset_name, url_id)
     
     if result["status"] == "error":
@@ -350,6 +356,7 @@ async def delete_url(
             detail=f"Failed to delete URL: {result.get('error', 'Unknown error')}"
         )
     
+    invalidate_stats_cache()
     return {"message": "URL deleted successfully"}
 
 
@@ -357,17 +364,10 @@ async def delete_url(
 async def process_url(
     url_id: str,
     dataset_name: str = "default",
-    current_user: User = Depends(require_scope("admin"))
+    current_user: User = AdminUser,
+    cognee_service: CogneeService = Depends(cognee_dep)
 ):
     """Process a URL (cognify)."""
-    try:
-        cognee_service = get_cognee_service()
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=f"Cognee service unavailable: {str(e)}"
-        )
-    
     result = await cognee_service.cognify(dataset_name)
     
     if result["status"] == "error":
@@ -381,50 +381,60 @@ async def process_url(
 
 @router.get("/users")
 async def list_users(
-    current_user: User = Depends(require_scope("admin")),
+    current_user: User = AdminUser,
     db: Session = Depends(get_db)
 ):
     """List all users."""
-    users = db.query(User).all()
-    return {
-        "users": [
-            {
-                "id": user.id,
-                "username": user.username,
-                "is_active": user.is_active,
-                "scopes": user.scopes,
-                "created_at": user.created_at.isoformat() if user.created_at else None
-            }
-            for user in users
-        ]
-    }
+    if time.monotonic() < _users_cache["expires"]:
+        return _users_cache["value"]
+    
+    # Select only the listed columns (skips hashed_password and ORM hydration);
+    # rows come back as mappings, so each one converts straight to a dict and
+    # orjson serializes created_at natively. Sync session - run in the threadpool.
+    rows = await run_in_threadpool(
+        lambda: db.execute(
+            select(User.id, User.username, User.is_active, User.scopes, User.created_at)
+        ).mappings().all()
+    )
+    payload = {"users": [dict(row) for row in rows]}
+    _users_cache["value"] = payload
+    _users_cache["expires"] = time.monotonic() + USERS_CACHE_TTL
+    return payload
 
 
 @router.patch("/users/{user_id}/activate")
 async def toggle_user_activation(
     user_id: int,
-    current_user: User = Depends(require_scope("admin")),
+    current_user: User = AdminUser,
     db: Session = Depends(get_db)
 ):
     """Activate or deactivate a user."""
-    user = db.query(User).filter(User.id == user_id).first()
+    def _toggle() -> Optional[Dict[str, Any]]:
+        # Single UPDATE ... RETURNING with server-side negation - no SELECT or ORM load
+        row = db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(is_active=~User.is_active)
+            .returning(User.id, User.username, User.is_active)
+        ).mappings().first()
+        if row is None:
+            return None
+        db.commit()
+        return dict(row)
+    
+    # Sync session - keep the commit off the event loop
+    user = await run_in_threadpool(_toggle)
     
-    if not user:
+    if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    # Toggle activation status
-    user.is_active = not user.is_active
-    db.commit()
-    db.refresh(user)
-    
+    invalidate_stats_cache()
+    invalidate_users_cache()
+    invalidate_user_cache(user_id)  # Activation status must take effect immediately
     return {
-        "message": f"User {'activated' if user.is_active else 'deactivated'} successfully",
-        "user": {
-            "id": user.id,
-            "username": user.username,
-            "is_active": user.is_active
-        }
+        "message": f"User {'activated' if user['is_active'] else 'deactivated'} successfully",
+        "user": user
     }
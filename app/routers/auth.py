@@ -1,62 +1,101 @@
 """Authentication routes."""
 from fastapi import APIRouter, Depends, HTTPException, status, Response, Request
 from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.responses import RedirectResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, insert, bindparam
 from sqlalchemy.orm import Session
 from datetime import timedelta
+import asyncio
 from app.database import get_db
 from app.models import User
 from app.schemas import UserCreate, UserResponse, UserLogin
-from app.security.auth import verify_password, get_password_hash, create_access_token
-from app.security.dependencies import get_current_user
+from app.security.auth import verify_and_update_password, get_password_hash, create_access_token, DUMMY_PASSWORD_HASH
+from app.security.dependencies import get_current_user, load_user, decode_request_token
+from app.routers.admin import invalidate_users_cache, invalidate_stats_cache
 from app.config import settings
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
+# Built once so every login/register reuses the same compiled-cache entry
+_user_by_name_stmt = select(User).where(User.username == bindparam("u"))
+
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     """Register a new user (default: scope='user', inactive)."""
-    # Check if username already exists
-    existing_user = db.query(User).filter(User.username == user_data.username).first()
+    # Check if username already exists (sync session - keep it off the event loop)
+    existing_user = await run_in_threadpool(
+        lambda: db.execute(_user_by_name_stmt, {"u": user_data.username}).scalar_one_or_none()
+    )
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already registered"
         )
     
-    # Create new user
-    hashed_password = get_password_hash(user_data.password)
-    new_user = User(
-        username=user_data.username,
-        hashed_password=hashed_password,
-        is_active=False,  # Inactive by default
-        scopes=["user"]  # Default scope
-    )
+    # Create new user (bcrypt is CPU-bound - hash in a worker thread)
+    hashed_password = await asyncio.to_thread(get_password_hash, user_data.password)
+    
+    def _save() -> UserResponse:
+        # INSERT ... RETURNING hands back the id and server-default timestamps,
+        # so no refresh SELECT is needed after the commit
+        new_user = db.scalar(
+            insert(User)
+            .values(
+                username=user_data.username,
+                hashed_password=hashed_password,
+                is_active=False,  # Inactive by default
+                scopes=["user"]  # Default scope
+            )
+            .returning(User)
+        )
+        created = UserResponse.model_validate(new_user)
+        db.commit()
+        return created
     
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    created = await run_in_threadpool(_save)
     
-    return new_user
+    # The admin user list and user count now include this user
+    invalidate_users_cache()
+    invalidate_stats_cache()
+    
+    return created
 
 
 @router.post("/login")
-def login(
+async def login(
     user_data: UserLogin,
     response: Response,
     db: Session = Depends(get_db)
 ):
     """Authenticate user and set HTTP-only cookie with JWT containing scopes."""
-    from fastapi.responses import RedirectResponse, JSONResponse
-    
-    user = db.query(User).filter(User.username == user_data.username).first()
+    user = await run_in_threadpool(
+        lambda: db.execute(_user_by_name_stmt, {"u": user_data.username}).scalar_one_or_none()
+    )
     
-    if not user or not verify_password(user_data.password, user.hashed_password):
+    # bcrypt verification is CPU-bound - run it in a worker thread. Unknown
+    # usernames are checked against a dummy hash so response time doesn't
+    # reveal which usernames exist
+    verified, upgraded_hash = await asyncio.to_thread(
+        verify_and_update_password,
+        user_data.password,
+        user.hashed_password if user else DUMMY_PASSWORD_HASH
+    )
+    if not user or not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password"
         )
     
+    if upgraded_hash is not None:
+        # Stored hash used outdated parameters - migrate it now that we know the password
+        def _store_upgraded_hash():
+            user.hashed_password = upgraded_hash
+            db.commit()
+            db.refresh(user)  # Reload here, not lazily on the event loop
+        await run_in_threadpool(_store_upgraded_hash)
+    
     # Create access token
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
     access_token = create_access_token(
@@ -98,7 +137,6 @@ def login(
 @router.post("/logout")
 def logout(response: Response):
     """Clear authentication cookie."""
-    from fastapi.responses import RedirectResponse
     response.delete_cookie(
         key="access_token",
         secure=settings.cookie_secure,
@@ -111,7 +149,6 @@ def logout(response: Response):
 @router.get("/logout")
 def logout_get(response: Response):
     """Clear authentication cookie (GET method for direct navigation)."""
-    from fastapi.responses import RedirectResponse
     response.delete_cookie(
         key="access_token",
         secure=settings.cookie_secure,
@@ -139,8 +176,7 @@ def check_auth(request: Request, db: Session = Depends(get_db)):
             "cookies": list(request.cookies.keys())
         }
     
-    from app.security.auth import decode_access_token
-    payload = decode_access_token(token)
+    payload = decode_request_token(request, token)
     
     if payload is None:
         return {
@@ -151,7 +187,10 @@ def check_auth(request: Request, db: Session = Depends(get_db)):
     
     user_id = payload.get("sub")
     if user_id:
-        user = db.query(User).filter(User.id == user_id).first()
+        try:
+            user = load_user(db, int(user_id))
+        except (ValueError, TypeError):
+            user = None
         if user:
             return {
                 "authenticated": True,
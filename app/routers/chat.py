@@ -1,13 +1,29 @@
 """Chat routes for end-user conversational interface."""
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Response
+from typing import Optional
+import asyncpg
+import logging
 from app.schemas import ChatMessage, ChatResponse
 from app.security.dependencies import require_scope, get_current_user
 from app.models import User
-from app.services.agno_service import get_agno_service
+from app.services.agno_service import get_agno_service, get_agno_pool, list_user_sessions
+
+# Configure logging
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
 
+async def agno_pool_dep() -> Optional[asyncpg.Pool]:
+    """Dependency providing the shared Agno database pool (None if unreachable)."""
+    try:
+        # Created at startup; retried here if the database was unreachable then
+        return await get_agno_pool()
+    except Exception as e:
+        logger.warning("Agno database unavailable: %s", e)
+        return None
+
+
 @router.post("", response_model=ChatResponse, status_code=status.HTTP_200_OK)
 async def chat(
     message: ChatMessage,
@@ -46,29 +62,24 @@ async def chat(
             detail=f"Error processing message: {str(e)}"
         )
     
-    return ChatResponse(
+    # Built from our own service result - skip input validation, and hand the
+    # bytes straight to the client instead of re-serializing via response_model
+    chat_response = ChatResponse.model_construct(
         response=result["response"],
         session_id=result["session_id"]
     )
+    return Response(content=chat_response.model_dump_json(), media_type="application/json")
 
 
 @router.get("/sessions")
 async def get_sessions(
-    current_user: User = Depends(require_scope("user"))
+    current_user: User = Depends(require_scope("user")),
+    pool: Optional[asyncpg.Pool] = Depends(agno_pool_dep)
 ):
     """List user's conversation sessions (optional, for UI)."""
-    try:
-        from app.services.agno_service import get_agno_service
-        
-        try:
-            agno_service = get_agno_service()
-            sessions = await agno_service.get_user_sessions(current_user.id)
-            return {"sessions": sessions}
-        except Exception as e:
-            # If service fails, return empty list
-            print(f"Warning: Failed to list sessions: {str(e)}")
-            return {"sessions": []}
-            
-    except Exception as e:
-        print(f"Error in get_sessions: {str(e)}")
+    if pool is None:
         return {"sessions": []}
+    
+    # Read straight from the pooled Agno database - no agent/SDK needed.
+    # list_user_sessions logs and returns [] on query failures itself.
+    return {"sessions": await list_user_sessions(pool, current_user.id)}
@@ -1,32 +1,77 @@
 """Page rendering routes."""
+import hashlib
+import os
 from fastapi import APIRouter, Depends, Request, HTTPException, status
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
 from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models import User
 from app.security.dependencies import get_current_user
+from app.config import settings
 
 router = APIRouter(tags=["pages"])
 templates = Jinja2Templates(directory="app/templates")
 
+if settings.is_production:
+    # Templates don't change under a running deploy: skip the per-render mtime
+    # check and share compiled bytecode across workers/restarts
+    templates.env.auto_reload = False
+    templates.env.cache_size = 400
+    templates.env.bytecode_cache = FileSystemBytecodeCache()
+
+TEMPLATES_DIR = "app/templates"
+
+# Public pages only vary by whether the visitor is logged in (base.html's
+# navbar): browsers may keep them but must revalidate, and shared caches must not
+PUBLIC_PAGE_CACHE_CONTROL = "private, no-cache"
+# Pages showing user data must never be stored
+PRIVATE_PAGE_CACHE_CONTROL = "private, no-store"
+
+
+def _templates_etag() -> str:
+    """ETag for the public pages: changes whenever any template file changes."""
+    digest = hashlib.blake2b(digest_size=8)
+    with os.scandir(TEMPLATES_DIR) as entries:
+        for entry in sorted(entries, key=lambda e: e.name):
+            digest.update(f"{entry.name}:{entry.stat().st_mtime_ns};".encode())
+    return f'"{digest.hexdigest()}"'
+
+
+# Only in production, where templates can't change under the running process;
+# development auto-reloads edited templates, so browsers must not keep old copies
+TEMPLATE_ETAG = _templates_etag() if settings.is_production else None
+
+
+def _public_page(request: Request, name: str) -> Response:
+    """Render a page that depends only on login state, with HTTP caching headers (304 on ETag match)."""
+    if TEMPLATE_ETAG is None:
+        return templates.TemplateResponse(name, {"request": request})
+    # One ETag per navbar variant, so logging in or out never revalidates to the old page
+    etag = TEMPLATE_ETAG[:-1] + ("-a\"" if request.cookies.get("access_token") else "-n\"")
+    headers = {"Cache-Control": PUBLIC_PAGE_CACHE_CONTROL, "ETag": etag, "Vary": "Cookie"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return templates.TemplateResponse(name, {"request": request}, headers=headers)
+
 
 @router.get("/", response_class=HTMLResponse)
 def landing_page(request: Request):
     """Landing page."""
-    return templates.TemplateResponse("landing.html", {"request": request})
+    return _public_page(request, "landing.html")
 
 
 @router.get("/login", response_class=HTMLResponse)
 def login_page(request: Request):
     """Login page."""
-    return templates.TemplateResponse("login.html", {"request": request})
+    return _public_page(request, "login.html")
 
 
 @router.get("/register", response_class=HTMLResponse)
 def register_page(request: Request):
     """Registration page."""
-    return templates.TemplateResponse("register.html", {"request": request})
+    return _public_page(request, "register.html")
 
 
 @router.get("/home", response_class=HTMLResponse)
@@ -38,7 +83,8 @@ def home_page(request: Request, current_user: User = Depends(get_current_user)):
             "request": request,
             "user": current_user,
             "is_active": current_user.is_active
-        }
+        },
+        headers={"Cache-Control": PRIVATE_PAGE_CACHE_CONTROL}
     )
 
 
@@ -55,8 +101,7 @@ def dashboard_page(
          raise HTTPException(status_code=404, detail="Admin not found")
     
     # Check if user has admin scope
-    user_scopes = current_user.scopes if isinstance(current_user.scopes, list) else []
-    if "admin" not in user_scopes:
+    if "admin" not in current_user.scope_set:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Admin access required"
@@ -67,5 +112,6 @@ def dashboard_page(
         {
             "request": request,
             "user": current_user
-        }
+        },
+        headers={"Cache-Control": PRIVATE_PAGE_CACHE_CONTROL}
     )
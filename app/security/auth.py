@@ -1,12 +1,40 @@
 """Authentication utilities for JWT tokens and password hashing."""
 from datetime import datetime, timedelta
-from typing import Optional, List
+from typing import Optional, List, Tuple
+import math
+import secrets
+import statistics
+import time
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.config import settings
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt cost floor; BCRYPT_ROUNDS can only raise it
+BCRYPT_MIN_ROUNDS = 12
+BCRYPT_ROUNDS = max(settings.bcrypt_rounds, BCRYPT_MIN_ROUNDS)
+
+# Password hashing context (hashes weaker than the configured cost are upgraded
+# on verify, so raising BCRYPT_ROUNDS rolls existing hashes forward at login)
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+)
+
+# Hash of a random, discarded password (same cost as real hashes). Login checks
+# unknown usernames against it so they take as long as wrong passwords
+DUMMY_PASSWORD_HASH = (
+    "$2b$12$j2CNCWeboKHP354WC0QP3OqPRO9H/045HX5KXR2lYP3Ha8T9eS4Ni"
+    if BCRYPT_ROUNDS == BCRYPT_MIN_ROUNDS
+    else pwd_context.hash(secrets.token_urlsafe(32))
+)
+
+# HS* tokens are verified with the raw secret - resolved once, not per request
+_DECODE_KEY = settings.secret_key
+_DECODE_ALGORITHMS = [settings.algorithm]
+# No audience in our tokens; every token we issue carries exp and sub
+_DECODE_OPTIONS = {"verify_aud": False, "require_exp": True, "require_sub": True}
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -14,14 +42,50 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password and, if its hash uses outdated settings, rehash it.
+    
+    Returns (verified, new_hash); new_hash is None unless the stored hash
+    should be replaced. One call instead of verify + needs_update + hash.
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def password_hash_needs_update(hashed_password: str) -> bool:
+    """Whether a stored hash uses outdated parameters (no hashing involved)."""
+    return pwd_context.needs_update(hashed_password)
+
+
 def get_password_hash(password: str) -> str:
     """Hash a password."""
     return pwd_context.hash(password)
 
 
+def calibrate_bcrypt_rounds(target_seconds: float = 0.25, samples: int = 3) -> int:
+    """Smallest bcrypt cost whose hash takes at least target_seconds on this host.
+    
+    Each extra round doubles the work, so one timed cost (median of a few
+    hashes at the minimum) is enough to extrapolate. Never below BCRYPT_MIN_ROUNDS.
+    """
+    hasher = pwd_context.handler("bcrypt").using(rounds=BCRYPT_MIN_ROUNDS)
+    
+    def _time_hash() -> float:
+        start = time.perf_counter()
+        hasher.hash("calibration")
+        return time.perf_counter() - start
+    
+    base = statistics.median(_time_hash() for _ in range(samples))
+    if base >= target_seconds:
+        return BCRYPT_MIN_ROUNDS
+    return BCRYPT_MIN_ROUNDS + math.ceil(math.log2(target_seconds / base))
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
     to_encode = data.copy()
+    if "sub" in to_encode:
+        # JWT requires sub to be a string (jose rejects integer subjects on decode)
+        to_encode["sub"] = str(to_encode["sub"])
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
@@ -35,7 +99,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 def decode_access_token(token: str) -> Optional[dict]:
     """Decode and verify a JWT token."""
     try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+        payload = jwt.decode(token, _DECODE_KEY, algorithms=_DECODE_ALGORITHMS, options=_DECODE_OPTIONS)
         return payload
     except JWTError as e:
         # Log the error for debugging
@@ -1,91 +1,189 @@
 """FastAPI dependencies for authentication and authorization."""
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict
 from fastapi import Depends, HTTPException, status, Security, Request
 from fastapi.security import SecurityScopes
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.orm import Session, load_only
+from typing import Any, Dict, List, Optional, Tuple
 from app.database import get_db
 from app.models import User
 from app.security.auth import decode_access_token
 
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Seconds a looked-up user is reused before re-reading the row
+USER_CACHE_TTL = 60
+USER_CACHE_MAX = 10_000
+
+# Columns kept for cached users (everything the app reads except the password hash)
+_USER_CACHE_COLUMNS = ("id", "username", "is_active", "scopes", "created_at", "updated_at")
+_USER_LOAD_OPTIONS = [load_only(*(getattr(User, column) for column in _USER_CACHE_COLUMNS))]
+
+# user_id -> (expires_at, column values); sync dependencies run on several threads
+_user_cache: "OrderedDict[int, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_user_cache_lock = threading.Lock()
+
+# Seconds a verified token is trusted without re-checking its signature
+# (never past the token's own exp)
+TOKEN_CACHE_TTL = 5.0
+TOKEN_CACHE_MAX = 4096
+
+# raw token -> (expires_at, payload)
+_token_cache: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+_token_cache_lock = threading.Lock()
+
+# Fixed-detail auth failures. A fresh exception per raise: re-raising a shared
+# instance would keep growing its __traceback__ (pinning each request's frames)
+def _not_authenticated() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+
+
+def _invalid_credentials() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+
+
+def _user_not_found() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+
+
+def _inactive_account() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Please ask admin to activate account to access features"
+    )
+
+
+@functools.lru_cache(maxsize=64)
+def _scope_headers(scope: str) -> Dict[str, str]:
+    """WWW-Authenticate header for a missing scope (shared, do not mutate)."""
+    return {"WWW-Authenticate": f'Bearer scope="{scope}"'}
+
+
+def load_user(db: Session, user_id: int) -> Optional[User]:
+    """Get a user by ID, served from a short-lived cache when possible.
+    
+    Cache hits return a fresh transient User built from the cached columns, so
+    no instance is shared between requests or tied to a closed session.
+    """
+    now = time.monotonic()
+    with _user_cache_lock:
+        cached = _user_cache.get(user_id)
+    if cached is not None and cached[0] > now:
+        return User(**cached[1])
+    
+    # Primary-key lookup (identity map first) without the password hash column
+    user = db.get(User, user_id, options=_USER_LOAD_OPTIONS)
+    if user is None:
+        return None
+    
+    values = {column: getattr(user, column) for column in _USER_CACHE_COLUMNS}
+    with _user_cache_lock:
+        _user_cache[user_id] = (now + USER_CACHE_TTL, values)
+        _user_cache.move_to_end(user_id)
+        while len(_user_cache) > USER_CACHE_MAX:
+            _user_cache.popitem(last=False)
+    return user
+
+
+def decode_request_token(request: Request, token: str) -> Optional[dict]:
+    """Decode the request's access token, at most once per request.
+    
+    The payload is kept on request.state, so any later auth check in the
+    same request (dependencies, handlers) reuses it instead of re-verifying.
+    Across requests, a verified token is trusted for a few seconds.
+    """
+    if getattr(request.state, "jwt_token", None) == token:
+        return request.state.jwt_payload
+    
+    # Chatty clients send the same token many times a second: reuse a recent
+    # verification instead of re-running the HMAC check
+    now = time.monotonic()
+    with _token_cache_lock:
+        cached = _token_cache.get(token)
+    if cached is not None and cached[0] > now:
+        payload = cached[1]
+    else:
+        payload = decode_access_token(token)
+        if payload is not None:
+            ttl = min(TOKEN_CACHE_TTL, payload["exp"] - time.time())
+            if ttl > 0:
+                with _token_cache_lock:
+                    _token_cache[token] = (now + ttl, payload)
+                    _token_cache.move_to_end(token)
+                    while len(_token_cache) > TOKEN_CACHE_MAX:
+                        _token_cache.popitem(last=False)
+    
+    request.state.jwt_token = token
+    request.state.jwt_payload = payload
+    return payload
+
+
+def invalidate_user_cache(user_id: int) -> None:
+    """Drop a cached user (call after changing the user's row)."""
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
+
 
 def get_current_user(
     request: Request,
     db: Session = Depends(get_db)
 ) -> User:
     """Get the current authenticated user from JWT token in HTTP-only cookie."""
-    import logging
-    logger = logging.getLogger(__name__)
-    
     token = request.cookies.get("access_token")
-    print(f"DEBUG AUTH: token found: {token is not None}")
     
     if not token:
-        print(f"DEBUG AUTH: No access_token cookie found. Cookies keys: {list(request.cookies.keys())}")
-        logger.error(f"No access_token cookie found in request. Available cookies: {list(request.cookies.keys())}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Not authenticated",
-        )
+        if logger.isEnabledFor(logging.ERROR):
+            logger.error("No access_token cookie found in request. Available cookies: %s", list(request.cookies.keys()))
+        raise _not_authenticated()
     
-    payload = decode_access_token(token)
-    print(f"DEBUG AUTH: payload decoded: {payload is not None}")
+    payload = decode_request_token(request, token)
     
     if payload is None:
         # Token is invalid - could be expired, malformed, or wrong secret key
-        print("DEBUG AUTH: JWT token decode failed")
         logger.error("JWT token decode failed - token may be expired or invalid")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-        )
+        raise _invalid_credentials()
     
     user_id = payload.get("sub")
-    print(f"DEBUG AUTH: user_id from sub: {user_id}")
     if user_id is None:
-        logger.error(f"JWT payload missing 'sub' claim: {payload}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-        )
+        logger.error("JWT payload missing 'sub' claim: %s", payload)
+        raise _invalid_credentials()
     
     # Cast user_id to int to be safe (JWT subs are often strings)
     try:
         user_id_int = int(user_id)
     except (ValueError, TypeError):
-        logger.error(f"JWT 'sub' claim is not a valid integer: {user_id}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-        )
+        logger.error("JWT 'sub' claim is not a valid integer: %s", user_id)
+        raise _invalid_credentials()
     
-    user = db.query(User).filter(User.id == user_id_int).first()
+    user = load_user(db, user_id_int)
     if user is None:
-        logger.error(f"User with ID {user_id_int} not found in database")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
-        )
+        logger.error("User with ID %s not found in database", user_id_int)
+        raise _user_not_found()
     
+    request.state.user_id = user_id_int
     return user
 
 
+@functools.lru_cache(maxsize=None)
 def require_scope(required_scope: str):
-    """Factory function that returns a dependency requiring a specific scope."""
+    """Factory function that returns a dependency requiring a specific scope.
+    
+    Memoized per scope so every route shares one dependency callable.
+    """
     def _require_scope(current_user: User = Depends(get_current_user)) -> User:
         """Require specific scope for the current user."""
         if not current_user.is_active:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Please ask admin to activate account to access features"
-            )
-        
-        user_scopes: List[str] = current_user.scopes if isinstance(current_user.scopes, list) else []
+            raise _inactive_account()
         
-        if required_scope not in user_scopes:
+        if required_scope not in current_user.scope_set:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Not enough permissions. Required scope: {required_scope}",
-                headers={"WWW-Authenticate": f'Bearer scope="{required_scope}"'},
+                headers=_scope_headers(required_scope),
             )
         
         return current_user
@@ -98,19 +196,16 @@ def require_scopes(
 ) -> User:
     """Require specific scope(s) for the current user using SecurityScopes."""
     if not current_user.is_active:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Please ask admin to activate account to access features"
-        )
+        raise _inactive_account()
     
-    user_scopes: List[str] = current_user.scopes if isinstance(current_user.scopes, list) else []
+    user_scopes = current_user.scope_set
     
     for scope in security_scopes.scopes:
         if scope not in user_scopes:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Not enough permissions. Required scope: {scope}",
-                headers={"WWW-Authenticate": f'Bearer scope="{scope}"'},
+                headers=_scope_headers(scope),
             )
     
     return current_user
@@ -119,8 +214,5 @@ def require_scopes(
 def require_active(current_user: User = Depends(get_current_user)) -> User:
     """Require the user to be active."""
     if not current_user.is_active:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Please ask admin to activate account to access features"
-        )
+        raise _inactive_account()
     return current_user
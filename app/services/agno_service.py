@@ -1,14 +1,73 @@
 """Agno service for agent initialization and management."""
-import uuid
+import time
+import asyncio
+import functools
+import secrets
 import logging
+import operator
 import asyncpg
-from typing import Optional
+from typing import Any, Callable, Dict, Optional, Tuple
 from app.config import settings
 from app.services.knowledge_service import get_knowledge_service
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Shared asyncpg pool for direct queries against the Agno database
+_agno_pool: Optional[asyncpg.Pool] = None
+_agno_pool_lock = asyncio.Lock()
+
+# Upper bound (seconds) for dashboard stats queries so a slow count can't hang the page
+STATS_QUERY_TIMEOUT = 2.0
+
+# Seconds an approximate conversation count is reused
+CONVERSATION_COUNT_TTL = 30.0
+
+# (count, expires_at) of the last approximate conversation count
+_conversation_count: Tuple[int, float] = (0, 0.0)
+
+# Prepared statements kept per pooled connection (asyncpg reuses them by query text)
+STATEMENT_CACHE_SIZE = 256
+
+# Sessions for one user. Agno stores user_id as a column or as a string in
+# session_data/metadata. One branch per location so each can use its own index
+# (an OR across them forces a sequential scan); each branch is pre-limited and
+# UNION drops sessions matched by more than one branch. Kept as a single
+# constant so every call hits the same cached prepared statement.
+_USER_SESSIONS_SQL = """
+    SELECT session_id, created_at, updated_at FROM (
+        (SELECT session_id, created_at, updated_at FROM agno_sessions
+         WHERE user_id = $1 ORDER BY updated_at DESC LIMIT $2)
+        UNION
+        (SELECT session_id, created_at, updated_at FROM agno_sessions
+         WHERE session_data->>'user_id' = $1 ORDER BY updated_at DESC LIMIT $2)
+        UNION
+        (SELECT session_id, created_at, updated_at FROM agno_sessions
+         WHERE metadata->>'user_id' = $1 ORDER BY updated_at DESC LIMIT $2)
+    ) AS user_sessions
+    ORDER BY updated_at DESC
+    LIMIT $2
+"""
+
+# Indexes backing the branches above, as (name, definition). agno_sessions
+# belongs to Agno (not our Alembic migrations), so they are built best-effort
+# in the background after startup.
+_SESSION_INDEXES = (
+    ("agno_sessions_user_id_updated_idx", "ON agno_sessions (user_id, updated_at DESC)"),
+    ("agno_sessions_sd_uid_idx", "ON agno_sessions ((session_data->>'user_id'), updated_at DESC)"),
+    ("agno_sessions_md_uid_idx", "ON agno_sessions ((metadata->>'user_id'), updated_at DESC)"),
+)
+
+# Validity of an existing index (None when it doesn't exist). A failed or
+# cancelled CONCURRENTLY build leaves an INVALID index behind
+_INDEX_VALID_SQL = """
+    SELECT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid
+    WHERE c.relname = $1 AND pg_catalog.pg_table_is_visible(c.oid)
+"""
+
+# pg_try_advisory_lock key held by the worker building the session indexes
+SESSION_INDEX_LOCK_KEY = 4242424243
+
 # Try to import Agno components
 try:
     from agno.agent import Agent
@@ -20,6 +79,157 @@ except ImportError:
     OpenAIChat = None
 
 
+async def get_agno_pool() -> asyncpg.Pool:
+    """Get or create the shared asyncpg pool for the Agno database.
+    
+    The pool is normally created once during application startup; creating it
+    lazily here covers the case where the database was unreachable at boot.
+    """
+    global _agno_pool
+    if _agno_pool is None:
+        async with _agno_pool_lock:
+            if _agno_pool is None:
+                _agno_pool = await asyncpg.create_pool(
+                    **settings.agno_dsn_parts,
+                    min_size=2,
+                    max_size=25,
+                    command_timeout=5,
+                    statement_cache_size=STATEMENT_CACHE_SIZE
+                )
+    return _agno_pool
+
+
+async def ensure_session_indexes() -> None:
+    """Create the indexes used by the user sessions query, if missing or invalid.
+    
+    Meant to run as a background task: builds on a large table can take a
+    while, so they use a dedicated connection without the pool's
+    command_timeout (a cancelled build would leave an INVALID index). Only one
+    worker builds at a time (the others skip); if Agno hasn't created
+    agno_sessions yet they are created on a later startup.
+    """
+    try:
+        conn = await asyncpg.connect(**settings.agno_dsn_parts, command_timeout=None)
+    except Exception as e:
+        logger.warning("Failed to create agno_sessions indexes: %s", e)
+        return
+    try:
+        if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", SESSION_INDEX_LOCK_KEY):
+            logger.info("Another worker is building agno_sessions indexes; skipping")
+            return
+        # The session-level lock is released when the connection closes
+        for name, definition in _SESSION_INDEXES:
+            valid = await conn.fetchval(_INDEX_VALID_SQL, name)
+            if valid:
+                continue
+            if valid is False:
+                logger.warning("Rebuilding invalid index %s", name)
+                await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            await conn.execute(f"CREATE INDEX CONCURRENTLY {name} {definition}")
+            logger.info("Created index %s", name)
+    except asyncpg.UndefinedTableError:
+        logger.info("agno_sessions does not exist yet; skipping session indexes")
+    except Exception as e:
+        logger.warning("Failed to create agno_sessions indexes: %s", e)
+    finally:
+        await conn.close()
+
+
+async def close_agno_pool() -> None:
+    """Close the shared asyncpg pool if it was created."""
+    global _agno_pool
+    if _agno_pool is not None:
+        await _agno_pool.close()
+        _agno_pool = None
+
+
+async def list_user_sessions(pool: asyncpg.Pool, user_id: int, limit: int = 50) -> list:
+    """List sessions for a specific user straight from the Agno database.
+    
+    Only needs the shared pool, so it works without the Agno SDK installed.
+    """
+    try:
+        async with pool.acquire() as conn:
+            # Parsed and planned once per pooled connection, then reused
+            rows = await conn.fetch(_USER_SESSIONS_SQL, str(user_id), limit)
+            
+            sessions = []
+            for row in rows:
+                sessions.append({
+                    "session_id": row["session_id"],
+                    "created_at": row["created_at"].isoformat() if row["created_at"] else None,
+                    "updated_at": row["updated_at"].isoformat() if row["updated_at"] else None,
+                })
+            
+            return sessions
+    except asyncpg.UndefinedTableError:
+        # Agno creates agno_sessions on first use - no sessions yet
+        return []
+    except Exception as e:
+        logger.warning("Failed to list sessions: %s", e)
+        return []
+
+
+async def count_conversations(pool: asyncpg.Pool, exact: bool = False) -> int:
+    """Count total conversations/sessions in the Agno database.
+    
+    By default returns the planner's estimate, reused for CONVERSATION_COUNT_TTL
+    seconds; exact=True always runs COUNT(*). Only needs the shared pool, so it
+    works without the Agno SDK installed.
+    """
+    global _conversation_count
+    if not exact and _conversation_count[1] > time.monotonic():
+        return _conversation_count[0]
+    
+    try:
+        async with pool.acquire() as conn:
+            count = None
+            if not exact:
+                # Planner estimate is O(1) regardless of table size - fine for a dashboard number
+                estimate = await asyncio.wait_for(
+                    conn.fetchval("SELECT reltuples::bigint FROM pg_class WHERE oid = 'agno_sessions'::regclass"),
+                    timeout=STATS_QUERY_TIMEOUT
+                )
+                if estimate is not None and estimate >= 0:
+                    count = estimate
+            
+            if count is None:
+                # Asked for exact, or never analyzed yet (reltuples = -1, so the table is new and small)
+                count = await asyncio.wait_for(
+                    conn.fetchval("SELECT COUNT(*) FROM agno_sessions"),
+                    timeout=STATS_QUERY_TIMEOUT
+                )
+    except asyncpg.UndefinedTableError:
+        # Agno creates agno_sessions on first use - no conversations yet
+        count = 0
+    except Exception as e:
+        logger.warning("Failed to count conversations: %s", e)
+        return 0
+    
+    if not exact:
+        _conversation_count = (count, time.monotonic() + CONVERSATION_COUNT_TTL)
+    return count
+
+
+# Agent response type -> function extracting its text, so each type is probed once
+_EXTRACTORS: Dict[type, Callable[[Any], str]] = {}
+
+
+def _response_text(response: Any) -> str:
+    """Extract the reply text from an agent response."""
+    extractor = _EXTRACTORS.get(type(response))
+    if extractor is None:
+        if hasattr(response, 'content'):
+            extractor = operator.attrgetter('content')
+        elif hasattr(response, 'text'):
+            extractor = operator.attrgetter('text')
+        else:
+            # str(...) returns plain strings unchanged
+            extractor = str
+        _EXTRACTORS[type(response)] = extractor
+    return extractor(response)
+
+
 class AgnoService:
     """Service for managing Agno agents."""
     
@@ -29,24 +239,22 @@ class AgnoService:
             raise ImportError("Agno package not found. Please install agno[all]")
         
         # Initialize PostgreSQL database for Agno (async for FastAPI)
-        # Ensure db_url uses async driver (postgresql+asyncpg://)
-        db_url = settings.agno_db_url
-        # Convert to async format if needed
-        if db_url.startswith("postgresql://"):
-            db_url = db_url.replace("postgresql://", "postgresql+asyncpg://", 1)
-        elif db_url.startswith("postgresql+psycopg://"):
-            db_url = db_url.replace("postgresql+psycopg://", "postgresql+asyncpg://", 1)
-        elif not db_url.startswith("postgresql+asyncpg://"):
-            # If it doesn't start with any known prefix, assume it needs the async prefix
-            if "://" not in db_url:
-                # If no protocol, assume it's just the connection part
-                db_url = f"postgresql+asyncpg://{db_url}"
-            else:
-                # Unknown protocol, try to convert
-                db_url = f"postgresql+asyncpg://{db_url.split('://', 1)[1]}"
-        
-        self.db = AsyncPostgresDb(db_url=db_url)
+        # AGNO_DB_URL is normalized to postgresql+asyncpg:// once, in settings
+        self.db = AsyncPostgresDb(db_url=settings.agno_async_db_url)
         self.knowledge_service = get_knowledge_service()
+        
+        # Model settings are static, so build the model (and its HTTP client) once
+        # and share it across agents instead of per chat turn
+        self.model = OpenAIChat(
+            id=settings.llm_model,
+            api_key=settings.llm_api_key
+        )
+        self._base_agent_kwargs = {
+            "model": self.model,
+            "db": self.db,
+            "add_history_to_context": True,  # Enable conversation persistence
+            "enable_user_memories": True,     # Enable personalized long-term memory
+        }
     
     def create_agent(
         self,
@@ -64,7 +272,7 @@ class AgnoService:
         """
         # Generate session_id if not provided
         if session_id is None:
-            session_id = str(uuid.uuid4())
+            session_id = secrets.token_hex(16)
         
         # Create Knowledge instance for agentic RAG (returns None, we use custom tool instead)
         knowledge = self.knowledge_service.create_knowledge()
@@ -72,17 +280,8 @@ class AgnoService:
         # Create custom search tool for Cognee
         search_tool = self.knowledge_service.create_search_tool()
         
-        # Initialize agent with OpenAI model
-        agent_kwargs = {
-            "model": OpenAIChat(
-                id=settings.llm_model,
-                api_key=settings.llm_api_key
-            ),
-            "db": self.db,
-            "session_id": session_id,
-            "add_history_to_context": True,  # Enable conversation persistence
-            "enable_user_memories": True,     # Enable personalized long-term memory
-        }
+        # Initialize agent with the shared OpenAI model
+        agent_kwargs = {**self._base_agent_kwargs, "session_id": session_id}
         
         # Add user_id if provided (for personalized memories)
         if user_id is not None:
@@ -130,18 +329,8 @@ class AgnoService:
         try:
             response = await agent.arun(message)
             
-            # Extract response content
-            if hasattr(response, 'content'):
-                response_text = response.content
-            elif hasattr(response, 'text'):
-                response_text = response.text
-            elif isinstance(response, str):
-                response_text = response
-            else:
-                response_text = str(response)
-            
             return {
-                "response": response_text,
+                "response": _response_text(response),
                 "session_id": actual_session_id
             }
         except Exception as e:
@@ -151,142 +340,27 @@ class AgnoService:
                 "session_id": actual_session_id
             }
 
-    async def get_conversation_stats(self) -> int:
+    async def get_conversation_stats(self, exact: bool = False) -> int:
         """Count total conversations/sessions in the Agno database."""
-        try:
-            # Extract connection details from AGNO_DB_URL
-            db_url = settings.agno_db_url
-            
-            # Remove protocol
-            if "://" in db_url:
-                db_url = db_url.split("://", 1)[1]
-            
-            # Parse connection string
-            if "@" in db_url:
-                auth, rest = db_url.split("@", 1)
-                user, password = auth.split(":", 1) if ":" in auth else (auth, "")
-                if "/" in rest:
-                    host_port, dbname = rest.split("/", 1)
-                    host, port = host_port.split(":") if ":" in host_port else (host_port, "5432")
-                else:
-                    host, port = rest.split(":") if ":" in rest else (rest, "5432")
-                    dbname = ""
-            else:
-                user, password, host, port, dbname = "", "", "localhost", "5432", ""
-            
-            # Connect to Agno database
-            conn = await asyncpg.connect(
-                user=user,
-                password=password,
-                host=host,
-                port=int(port),
-                database=dbname
-            )
-            
-            try:
-                # Check if agno_sessions table exists
-                table_exists = await conn.fetchval(
-                    "SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'agno_sessions')"
-                )
-                if table_exists:
-                    return await conn.fetchval("SELECT COUNT(*) FROM agno_sessions")
-                return 0
-            finally:
-                await conn.close()
-        except Exception as e:
-            logger.warning(f"Failed to count conversations: {str(e)}")
-            return 0
-
+        return await count_conversations(await get_agno_pool(), exact)
 
     async def get_user_sessions(self, user_id: int, limit: int = 50) -> list:
         """List sessions for a specific user."""
-        try:
-            # Extract connection details from AGNO_DB_URL
-            db_url = settings.agno_db_url
-            
-            # Remove protocol
-            if "://" in db_url:
-                db_url = db_url.split("://", 1)[1]
-            
-            # Parse connection string
-            if "@" in db_url:
-                auth, rest = db_url.split("@", 1)
-                user, password = auth.split(":", 1) if ":" in auth else (auth, "")
-                if "/" in rest:
-                    host_port, dbname = rest.split("/", 1)
-                    host, port = host_port.split(":") if ":" in host_port else (host_port, "5432")
-                else:
-                    host, port = rest.split(":") if ":" in rest else (rest, "5432")
-                    dbname = ""
-            else:
-                user, password, host, port, dbname = "", "", "localhost", "5432", ""
-            
-            # Connect to Agno database
-            conn = await asyncpg.connect(
-                user=user,
-                password=password,
-                host=host,
-                port=int(port),
-                database=dbname
-            )
-            
-            try:
-                # Check if agno_sessions table exists
-                table_exists = await conn.fetchval(
-                    "SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'agno_sessions')"
-                )
-                
-                if not table_exists:
-                    return []
-                
-                # Query sessions for this user
-                # Note: Agno stores user_id as string in session_data or metadata
-                user_id_str = str(user_id)
-                rows = await conn.fetch(
-                    """
-                    SELECT session_id, created_at, updated_at, session_data, metadata
-                    FROM agno_sessions
-                    WHERE user_id = $1 OR session_data->>'user_id' = $2 OR metadata->>'user_id' = $2
-                    ORDER BY updated_at DESC
-                    LIMIT $3
-                    """,
-                    user_id_str,
-                    user_id_str,
-                    limit
-                )
-                
-                sessions = []
-                for row in rows:
-                    sessions.append({
-                        "session_id": row["session_id"],
-                        "created_at": row["created_at"].isoformat() if row["created_at"] else None,
-                        "updated_at": row["updated_at"].isoformat() if row["updated_at"] else None,
-                    })
-                
-                return sessions
-            finally:
-                await conn.close()
-        except Exception as e:
-            logger.warning(f"Failed to list sessions: {str(e)}")
-            return []
+        return await list_user_sessions(await get_agno_pool(), user_id, limit)
 
 
 # Global instance
-_agno_service: Optional[AgnoService] = None
-
-
+@functools.cache
 def get_agno_service() -> AgnoService:
     """Get or create Agno service instance.
     
     Note: This will raise an exception if Agno cannot be initialized.
-    The service should be initialized lazily when first needed.
+    The service should be initialized lazily when first needed; failures are
+    not cached, so the next call retries.
     """
-    global _agno_service
-    if _agno_service is None:
-        try:
-            _agno_service = AgnoService()
-        except Exception as e:
-            # Log error but don't fail silently
-            logger.warning(f"Failed to initialize Agno service: {str(e)}")
-            raise
-    return _agno_service
+    try:
+        return AgnoService()
+    except Exception as e:
+        # Log error but don't fail silently
+        logger.warning(f"Failed to initialize Agno service: {str(e)}")
+        raise
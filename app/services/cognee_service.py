@@ -1,14 +1,32 @@
 """Cognee service for knowledge graph management."""
 import os
+import time
 import asyncio
+import functools
 import logging
-from typing import Optional, List, Dict, Any
+import aiofiles.os as aio_os
+from typing import Optional, List, Dict, Any, Tuple, Callable, Awaitable
 from app.config import settings
-from app.utils.file_handler import get_file_preview as get_local_file_preview
+from app.utils.file_handler import get_file_preview as get_local_file_preview, get_uploaded_file_preview, truncate_preview
+from app.services.dataset_cache import get_classified, paginate, invalidate as invalidate_dataset
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Export Cognee's configuration before importing it, so the SDK sees it
+# from its very first (lazy) initialization
+os.environ.update({
+    "LLM_API_KEY": settings.llm_api_key,
+    "LLM_PROVIDER": settings.llm_provider,
+    "LLM_MODEL": settings.llm_model,
+    "DB_PROVIDER": settings.db_provider,
+    "DB_URL": settings.db_url,
+    "GRAPH_DATABASE_PROVIDER": settings.graph_database_provider,
+    "VECTOR_DB_PROVIDER": settings.vector_db_provider,
+    "REQUIRE_AUTH": settings.require_auth,
+    "ALLOW_HTTP_REQUESTS": settings.allow_http_requests,
+})
+
 # Try to import Cognee - handle different possible import paths
 try:
     from cognee import Cognee
@@ -30,6 +48,47 @@ except ImportError:
             CogneeClient = None
             cogwit = None
 
+# Resolve the search-type enum once at import instead of on every query
+try:
+    from cognee.primitives import SearchType
+    _SEARCH_TYPE_MAP: Dict[str, Any] = {
+        "GRAPH_COMPLETION": SearchType.GRAPH_COMPLETION,
+        "CHUNKS": SearchType.CHUNKS,
+        "SUMMARIES": SearchType.SUMMARIES,
+    }
+except (ImportError, AttributeError):
+    # Fallback if SearchType not available: pass the raw names through
+    _SEARCH_TYPE_MAP = {name: name for name in ("GRAPH_COMPLETION", "CHUNKS", "SUMMARIES")}
+_DEFAULT_SEARCH_TYPE = _SEARCH_TYPE_MAP["GRAPH_COMPLETION"]
+
+# Seconds an identical Cognee error is suppressed after being logged
+ERROR_LOG_INTERVAL = 1.0
+ERROR_LOG_MAX_KEYS = 128
+
+# error text -> when it was last logged
+_error_logged_at: Dict[str, float] = {}
+
+
+def _log_error(message: str, error: Exception) -> None:
+    """Log a failed Cognee call, at most once per second per distinct error.
+    
+    When Cognee is down every request fails the same way; repeating (and
+    formatting the traceback of) each failure would only flood the log.
+    Tracebacks are captured only when debug logging is enabled.
+    """
+    key = f"{message}: {error}"
+    now = time.monotonic()
+    if now - _error_logged_at.get(key, -ERROR_LOG_INTERVAL) < ERROR_LOG_INTERVAL:
+        return
+    if len(_error_logged_at) >= ERROR_LOG_MAX_KEYS:
+        _error_logged_at.clear()
+    _error_logged_at[key] = now
+    logger.error("%s: %s", message, error, exc_info=logger.isEnabledFor(logging.DEBUG))
+
+
+# Concurrent Cognee adds in a batch upload (higher mostly adds contention)
+ADD_FILES_CONCURRENCY = 8
+
 
 class CogneeService:
     """Service for interacting with Cognee API/SDK."""
@@ -41,17 +100,7 @@ class CogneeService:
             raise ValueError("LLM_API_KEY is required for Cognee initialization")
         if not settings.db_url:
             raise ValueError("DB_URL is required for Cognee initialization")
-        
-        # Set environment variables for Cognee
-        os.environ["LLM_API_KEY"] = settings.llm_api_key
-        os.environ["LLM_PROVIDER"] = settings.llm_provider
-        os.environ["LLM_MODEL"] = settings.llm_model
-        os.environ["DB_PROVIDER"] = settings.db_provider
-        os.environ["DB_URL"] = settings.db_url
-        os.environ["GRAPH_DATABASE_PROVIDER"] = settings.graph_database_provider
-        os.environ["VECTOR_DB_PROVIDER"] = settings.vector_db_provider
-        os.environ["REQUIRE_AUTH"] = settings.require_auth
-        os.environ["ALLOW_HTTP_REQUESTS"] = settings.allow_http_requests
+
         
         # Initialize Cognee instance
         try:
@@ -93,48 +142,139 @@ class CogneeService:
             raise
         except Exception as e:
             raise RuntimeError(f"Cognee initialization error: {str(e)}")
+        
+        # (operation, dataset_name, arg) -> task of the add currently running
+        self._inflight: Dict[Tuple[str, ...], asyncio.Task] = {}
+        # dataset_name -> number of successful adds so far
+        self._add_generation: Dict[str, int] = {}
+        # dataset_name -> (add generation when it started, task) of the running cognify
+        self._cognify_runs: Dict[str, Tuple[int, asyncio.Task]] = {}
+    
+    def _coalesce(self, key: Tuple[str, ...], make_call: Callable[[], Awaitable[Dict[str, Any]]]) -> Awaitable[Dict[str, Any]]:
+        """Share one in-flight Cognee call between concurrent identical requests.
+        
+        The first caller starts the call; later callers with the same key await
+        the same task until it finishes. The task is shielded so a disconnecting
+        caller doesn't cancel the work the others are waiting on.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(make_call())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return asyncio.shield(task)
     
     async def add_file(self, dataset_name: str, file_path: str) -> Dict[str, Any]:
         """Add a file to a dataset."""
+        return await self._coalesce(
+            ("add_file", dataset_name, file_path),
+            lambda: self._add_file(dataset_name, file_path)
+        )
+    
+    async def _add_file(self, dataset_name: str, file_path: str) -> Dict[str, Any]:
         if self.cognee is None:
             return {"status": "error", "error": "Cognee not initialized"}
         
         try:
             from pathlib import Path
-            if not os.path.exists(file_path):
+            if not await aio_os.path.exists(file_path):
                 return {"status": "error", "error": f"File not found: {file_path}"}
             
             result = await self.cognee.add(
                 data=Path(file_path),
                 dataset_name=dataset_name,
             )
+            self._add_generation[dataset_name] = self._add_generation.get(dataset_name, 0) + 1
+            invalidate_dataset(dataset_name)
             return {"status": "success", "data": result}
         except Exception as e:
-            logger.error(f"Error adding file: {str(e)}", exc_info=True)
+            _log_error("Error adding file", e)
             return {"status": "error", "error": str(e)}
     
+    async def add_files_batch(
+        self,
+        dataset_name: str,
+        file_paths: List[str],
+        concurrency: int = ADD_FILES_CONCURRENCY
+    ) -> Dict[str, Any]:
+        """Add several files concurrently, then cognify the dataset once.
+        
+        At most `concurrency` adds run at a time. The graph is built a single
+        time at the end instead of once per file.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def _add_one(file_path: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.add_file(dataset_name, file_path)
+        
+        results = await asyncio.gather(*(_add_one(path) for path in file_paths), return_exceptions=True)
+        results = [
+            {"status": "error", "error": str(result)} if isinstance(result, BaseException) else result
+            for result in results
+        ]
+        
+        # Nothing new to build a graph from if every add failed
+        added = any(result["status"] == "success" for result in results)
+        cognify_result = await self.cognify(dataset_name) if added else None
+        return {"files": results, "cognify": cognify_result}
+    
     async def add_url(self, dataset_name: str, url: str) -> Dict[str, Any]:
         """Add a URL to a dataset."""
+        return await self._coalesce(
+            ("add_url", dataset_name, url),
+            lambda: self._add_url(dataset_name, url)
+        )
+    
+    async def _add_url(self, dataset_name: str, url: str) -> Dict[str, Any]:
         try:
             result = await self.cognee.add(
                 data=url,
                 dataset_name=dataset_name,
             )
+            self._add_generation[dataset_name] = self._add_generation.get(dataset_name, 0) + 1
+            invalidate_dataset(dataset_name)
             return {"status": "success", "data": result}
         except Exception as e:
-            logger.error(f"Error adding URL: {str(e)}", exc_info=True)
+            _log_error("Error adding URL", e)
             return {"status": "error", "error": str(e)}
     
     async def cognify(self, dataset_name: str) -> Dict[str, Any]:
-        """Trigger knowledge graph creation for a dataset."""
+        """Trigger knowledge graph creation for a dataset.
+        
+        Joins a cognify of the same dataset that is already running, unless
+        data was added after it started; then one follow-up run is queued
+        behind it and shared by every caller waiting for it.
+        """
+        generation = self._add_generation.get(dataset_name, 0)
+        while True:
+            run = self._cognify_runs.get(dataset_name)
+            if run is None or run[1].done():
+                task = asyncio.ensure_future(self._cognify(dataset_name))
+                self._cognify_runs[dataset_name] = (self._add_generation.get(dataset_name, 0), task)
+                task.add_done_callback(lambda done: self._forget_cognify(dataset_name, done))
+                return await asyncio.shield(task)
+            started_generation, task = run
+            if started_generation >= generation:
+                return await asyncio.shield(task)
+            # Started before our data was added - let it finish, then run again
+            await asyncio.wait({task})
+    
+    def _forget_cognify(self, dataset_name: str, task: asyncio.Task) -> None:
+        run = self._cognify_runs.get(dataset_name)
+        if run is not None and run[1] is task:
+            del self._cognify_runs[dataset_name]
+    
+    async def _cognify(self, dataset_name: str) -> Dict[str, Any]:
         if self.cognee is None:
             return {"status": "error", "error": "Cognee not initialized"}
         
         try:
             result = await self.cognee.cognify(dataset_names=[dataset_name])
+            invalidate_dataset(dataset_name)
             return {"status": "success", "data": result}
         except Exception as e:
-            logger.error(f"Error cognifying: {str(e)}", exc_info=True)
+            _log_error("Error cognifying", e)
             return {"status": "error", "error": str(e)}
     
     async def memify(self, dataset_name: str) -> Dict[str, Any]:
@@ -143,7 +283,7 @@ class CogneeService:
             result = await self.cognee.memify(dataset_names=[dataset_name])
             return {"status": "success", "data": result}
         except Exception as e:
-            logger.error(f"Error memifying: {str(e)}", exc_info=True)
+            _log_error("Error memifying", e)
             return {"status": "error", "error": str(e)}
     
     async def get_dataset_data(self, dataset_name: str) -> Dict[str, Any]:
@@ -152,112 +292,54 @@ class CogneeService:
             result = await self.cognee.get_dataset_data(dataset_name=dataset_name)
             return {"status": "success", "data": result}
         except Exception as e:
-            logger.error(f"Error getting dataset data: {str(e)}", exc_info=True)
+            _log_error("Error getting dataset data", e)
             return {"status": "error", "error": str(e)}
 
-    async def list_files(self, dataset_name: str = "default") -> List[Dict[str, str]]:
-        """List all files in a dataset."""
-        result = await self.get_dataset_data(dataset_name)
-        
-        if result["status"] == "error":
-            logger.error(f"Failed to list files: {result.get('error')}")
-            return []
-        
-        files = []
-        if result.get("data"):
-            dataset_data = result["data"]
-            if isinstance(dataset_data, list):
-                for idx, item in enumerate(dataset_data):
-                    # Check if item is a file
-                    if isinstance(item, dict):
-                        if "file_path" in item or "path" in item or "filename" in item:
-                            files.append({
-                                "id": item.get("id", str(idx)),
-                                "filename": item.get("filename") or item.get("path") or item.get("file_path", "Unknown"),
-                                "type": "file"
-                            })
-                    elif hasattr(item, "__fspath__"):
-                        # Path object
-                        file_path = str(item)
-                        files.append({
-                            "id": str(idx),
-                            "filename": os.path.basename(file_path),
-                            "type": "file"
-                        })
-                    elif isinstance(item, str) and not item.startswith("http"):
-                        # File path string (not URL)
-                        files.append({
-                            "id": str(idx),
-                            "filename": os.path.basename(item),
-                            "type": "file"
-                        })
-        return files
+    async def list_files(
+        self,
+        dataset_name: str = "default",
+        limit: Optional[int] = None,
+        offset: int = 0
+    ) -> List[Dict[str, str]]:
+        """List files in a dataset (optionally one page of them)."""
+        view = await get_classified(self, dataset_name)
+        return paginate(view.files, limit, offset)
 
-    async def list_urls(self, dataset_name: str = "default") -> List[Dict[str, str]]:
-        """List all URLs in a dataset."""
-        result = await self.get_dataset_data(dataset_name)
-        
-        if result["status"] == "error":
-            logger.error(f"Failed to list URLs: {result.get('error')}")
-            return []
-        
-        urls = []
-        if result.get("data"):
-            dataset_data = result["data"]
-            if isinstance(dataset_data, list):
-                for idx, item in enumerate(dataset_data):
-                    # Check if item is a URL
-                    if isinstance(item, dict):
-                        if "url" in item or "link" in item:
-                            urls.append({
-                                "id": item.get("id", str(idx)),
-                                "url": item.get("url") or item.get("link", "Unknown"),
-                                "type": "url"
-                            })
-                        elif isinstance(item.get("data"), str) and item.get("data", "").startswith("http"):
-                            urls.append({
-                                "id": item.get("id", str(idx)),
-                                "url": item["data"],
-                                "type": "url"
-                            })
-                    elif isinstance(item, str) and item.startswith("http"):
-                        # URL string
-                        urls.append({
-                            "id": str(idx),
-                            "url": item,
-                            "type": "url"
-                        })
-        return urls
+    async def list_urls(
+        self,
+        dataset_name: str = "default",
+        limit: Optional[int] = None,
+        offset: int = 0
+    ) -> List[Dict[str, str]]:
+        """List URLs in a dataset (optionally one page of them)."""
+        view = await get_classified(self, dataset_name)
+        return paginate(view.urls, limit, offset)
+
+    async def list_dataset_summary(self, dataset_name: str = "default") -> Dict[str, List[Dict[str, str]]]:
+        """List both the files and the URLs of a dataset from one fetch."""
+        view = await get_classified(self, dataset_name)
+        return {"files": view.files, "urls": view.urls}
 
     async def get_file_preview(self, file_id: str, dataset_name: str = "default") -> Optional[str]:
         """Get file preview content."""
-        result = await self.get_dataset_data(dataset_name)
-        
-        if result["status"] == "success" and result.get("data"):
-            dataset_data = result["data"]
-            if isinstance(dataset_data, list):
-                # Find the file by ID
-                for item in dataset_data:
-                    item_id = str(item.get("id", "")) if isinstance(item, dict) else str(item)
-                    if item_id == file_id:
-                        # Try to get file path from item
-                        if isinstance(item, dict):
-                            file_path = item.get("file_path") or item.get("path") or item.get("filename", "")
-                            if file_path and os.path.exists(file_path):
-                                return get_local_file_preview(file_path)
-                            # If file path not found, try to get content from Cognee
-                            content = item.get("content") or item.get("text", "")
-                            if content:
-                                return content[:1000] + ("..." if len(content) > 1000 else "")
+        view = await get_classified(self, dataset_name)
         
-        # Fallback: Check if file exists in uploads directory
-        uploads_dir = "app/static/uploads"
-        file_path = os.path.join(uploads_dir, file_id)
+        # Find the file by ID
+        item = view.get_item(file_id)
+        # Try to get file path from item
+        if isinstance(item, dict):
+            file_path = item.get("file_path") or item.get("path") or item.get("filename", "")
+            # Disk checks and reads run in threads so they don't stall the event loop
+            if file_path and await aio_os.path.exists(file_path):
+                return await asyncio.to_thread(get_local_file_preview, file_path)
+            # If file path not found, try to get content from Cognee
+            content = item.get("content") or item.get("text", "")
+            if content:
+                return truncate_preview(content)
         
-        if os.path.exists(file_path):
-            return get_local_file_preview(file_path)
-            
-        return None
+        # Fallback: Check if file exists in uploads directory (lookup and read
+        # in one worker thread - a cold index means a directory scan)
+        return await asyncio.to_thread(get_uploaded_file_preview, file_id)
     
     async def delete_data(self, dataset_name: str, data_id: str) -> Dict[str, Any]:
         """Delete data from a dataset."""
@@ -266,9 +348,10 @@ class CogneeService:
         
         try:
             result = await self.cognee.delete_data(dataset_name=dataset_name, data_id=data_id)
+            invalidate_dataset(dataset_name)
             return {"status": "success", "data": result}
         except Exception as e:
-            logger.error(f"Error deleting data: {str(e)}", exc_info=True)
+            _log_error("Error deleting data", e)
             return {"status": "error", "error": str(e)}
     
     async def search(
@@ -281,51 +364,32 @@ class CogneeService:
             if self.cognee is None:
                 return {"status": "error", "error": "Cognee not initialized"}
             
-            # Try to get SearchType enum
-            try:
-                from cognee.primitives import SearchType
-                search_type_map = {
-                    "GRAPH_COMPLETION": SearchType.GRAPH_COMPLETION,
-                    "CHUNKS": SearchType.CHUNKS,
-                    "SUMMARIES": SearchType.SUMMARIES,
-                }
-                search_type_enum = search_type_map.get(search_type, SearchType.GRAPH_COMPLETION)
-            except (ImportError, AttributeError):
-                # Fallback if SearchType not available
-                search_type_enum = search_type
+            search_type_enum = _SEARCH_TYPE_MAP.get(search_type, _DEFAULT_SEARCH_TYPE)
             
-            if self.use_cogwit:
-                result = await self.cognee.search(
-                    query_text=query,
-                    query_type=search_type_enum,
-                )
-            else:
-                result = await self.cognee.search(
-                    query_text=query,
-                    query_type=search_type_enum,
-                )
+            # Same call for the cogwit and the Cognee clients
+            result = await self.cognee.search(
+                query_text=query,
+                query_type=search_type_enum,
+            )
             return {"status": "success", "data": result}
         except Exception as e:
-            logger.error(f"Error searching: {str(e)}", exc_info=True)
+            _log_error("Error searching", e)
             return {"status": "error", "error": str(e)}
 
 
-# Global instance
-_cognee_service: Optional[CogneeService] = None
-
-
+@functools.cache
 def get_cognee_service() -> CogneeService:
     """Get or create Cognee service instance.
     
     Note: This will raise an exception if Cognee cannot be initialized.
-    The service should be initialized lazily when first needed.
+    The service should be initialized lazily when first needed; failures are
+    not cached, so the next call retries. Callers are async dependencies on
+    the event loop thread and construction never awaits, so two first calls
+    can't build it twice; a thread-pool caller would need a lock here.
     """
-    global _cognee_service
-    if _cognee_service is None:
-        try:
-            _cognee_service = CogneeService()
-        except Exception as e:
-            # Log error but don't fail silently
-            logger.warning(f"Failed to initialize Cognee service: {str(e)}")
-            raise
-    return _cognee_service
+    try:
+        return CogneeService()
+    except Exception as e:
+        # Log error but don't fail silently
+        logger.warning(f"Failed to initialize Cognee service: {str(e)}")
+        raise
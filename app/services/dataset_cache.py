@@ -0,0 +1,224 @@
+"""Short-lived cache of classified dataset contents (files vs. URLs)."""
+import os
+import asyncio
+import time
+import logging
+import orjson
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Seconds a classified dataset view is reused before re-fetching from Cognee
+DATASET_CACHE_TTL = 30.0
+
+# Datasets with at least this many items are classified in a worker thread
+# so the event loop keeps serving other requests meanwhile
+CLASSIFY_IN_THREAD_MIN = 5000
+
+# dataset_name -> (expires_at, view)
+_cache: Dict[str, Tuple[float, "DatasetView"]] = {}
+
+# dataset_name -> lock held while one request refreshes the view
+_locks: Dict[str, asyncio.Lock] = {}
+
+
+@dataclass
+class DatasetView:
+    """Dataset contents split into files and URLs."""
+    files: List[Dict[str, str]] = field(default_factory=list)
+    urls: List[Dict[str, str]] = field(default_factory=list)
+    n_files: int = 0
+    n_urls: int = 0
+    items: List[Any] = field(default_factory=list)  # Raw dataset items (for previews)
+    _by_id: Optional[Dict[str, Any]] = field(default=None, repr=False)
+
+    def get_item(self, item_id: str) -> Any:
+        """Find a raw dataset item by id (first match), or None.
+        
+        The id index is built on first use and lives as long as the cached view,
+        so repeated preview clicks are dict lookups instead of list scans.
+        """
+        if self._by_id is None:
+            by_id: Dict[str, Any] = {}
+            for idx, item in enumerate(self.items):
+                # Same ids the file/URL listings hand out (position when missing)
+                if isinstance(item, dict):
+                    by_id.setdefault(str(item.get("id", idx)), item)
+                else:
+                    by_id.setdefault(str(idx), item)
+                    by_id.setdefault(str(item), item)
+            self._by_id = by_id
+        return self._by_id.get(item_id)
+
+
+# Keys that mark a dict item as a file / as a URL
+_FILE_KEYS = frozenset(("file_path", "path", "filename"))
+_URL_KEYS = frozenset(("url", "link"))
+
+# Keys holding an item's display name / address, in order of preference
+_FILENAME_KEYS = ("filename", "path", "file_path")
+_URL_VALUE_KEYS = ("url", "link")
+
+_HTTP_PREFIXES = ("http://", "https://")
+
+
+def _first_value(item: Dict[str, Any], keys: Tuple[str, ...]) -> Any:
+    """First non-empty value among keys, else "Unknown"."""
+    for key in keys:
+        value = item.get(key)
+        if value:
+            return value
+    return "Unknown"
+
+
+def _classify_dict(idx: int, item: Dict[str, Any], files: List[Dict[str, str]], urls: List[Dict[str, str]]) -> None:
+    # A dict item may be both a file and a URL
+    if not _FILE_KEYS.isdisjoint(item.keys()):
+        files.append({
+            "id": item.get("id", str(idx)),
+            "filename": _first_value(item, _FILENAME_KEYS),
+            "type": "file"
+        })
+    if not _URL_KEYS.isdisjoint(item.keys()):
+        urls.append({
+            "id": item.get("id", str(idx)),
+            "url": _first_value(item, _URL_VALUE_KEYS),
+            "type": "url"
+        })
+    else:
+        data = item.get("data")
+        if isinstance(data, str) and data.startswith(_HTTP_PREFIXES):
+            urls.append({
+                "id": item.get("id", str(idx)),
+                "url": data,
+                "type": "url"
+            })
+
+
+def _classify_str(idx: int, item: str, files: List[Dict[str, str]], urls: List[Dict[str, str]]) -> None:
+    if item.startswith(_HTTP_PREFIXES):
+        # URL string
+        urls.append({
+            "id": str(idx),
+            "url": item,
+            "type": "url"
+        })
+    else:
+        # File path string (not URL)
+        files.append({
+            "id": str(idx),
+            "filename": os.path.basename(item),
+            "type": "file"
+        })
+
+
+def _classify_path(idx: int, item: os.PathLike, files: List[Dict[str, str]], urls: List[Dict[str, str]]) -> None:
+    files.append({
+        "id": str(idx),
+        "filename": os.path.basename(os.fspath(item)),
+        "type": "file"
+    })
+
+
+def _classify_fallback(idx: int, item: Any, files: List[Dict[str, str]], urls: List[Dict[str, str]]) -> None:
+    # Subclasses and concrete path types (PosixPath, ...) miss the exact-type lookup
+    if isinstance(item, dict):
+        _classify_dict(idx, item, files, urls)
+    elif isinstance(item, os.PathLike):
+        _classify_path(idx, item, files, urls)
+    elif isinstance(item, str):
+        _classify_str(idx, item, files, urls)
+
+
+# Exact item type -> classifier, so homogeneous datasets skip the isinstance ladder
+CLASSIFIERS: Dict[type, Callable[[int, Any, List[Dict[str, str]], List[Dict[str, str]]], None]] = {
+    dict: _classify_dict,
+    str: _classify_str,
+}
+
+
+def classify_dataset(dataset_data: List[Any]) -> DatasetView:
+    """Classify dataset items into files and URLs in a single pass."""
+    files: List[Dict[str, str]] = []
+    urls: List[Dict[str, str]] = []
+    get_classifier = CLASSIFIERS.get
+    for idx, item in enumerate(dataset_data):
+        classifier = get_classifier(type(item))
+        if classifier is None:
+            classifier = _classify_fallback
+            # Remember concrete path types so later items take the fast path
+            if isinstance(item, os.PathLike):
+                CLASSIFIERS[type(item)] = _classify_path
+        classifier(idx, item, files, urls)
+
+    return DatasetView(
+        files=files,
+        urls=urls,
+        n_files=len(files),
+        n_urls=len(urls),
+        items=dataset_data
+    )
+
+
+async def get_classified(cognee_service, dataset_name: str = "default") -> DatasetView:
+    """Get the classified view of a dataset, fetching from Cognee at most once per TTL.
+
+    The stats card, files tab and URLs tab of the dashboard all share this
+    view, so a full dashboard load costs a single Cognee round-trip.
+    """
+    cached = _cache.get(dataset_name)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+
+    # Concurrent misses wait for the first one's fetch instead of each
+    # calling Cognee themselves
+    lock = _locks.get(dataset_name)
+    if lock is None:
+        lock = _locks[dataset_name] = asyncio.Lock()
+    async with lock:
+        cached = _cache.get(dataset_name)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        return await _refresh(cognee_service, dataset_name)
+
+
+async def _refresh(cognee_service, dataset_name: str) -> DatasetView:
+    """Fetch and classify a dataset, caching the view on success."""
+    now = time.monotonic()
+    result = await cognee_service.get_dataset_data(dataset_name)
+
+    if result["status"] == "error":
+        # Don't cache failures so the next request retries
+        logger.error("Failed to load dataset '%s': %s", dataset_name, result.get("error"))
+        return DatasetView()
+
+    dataset_data = result.get("data")
+    if isinstance(dataset_data, (bytes, str)):
+        # Some clients hand back the raw JSON body; decode it with orjson
+        try:
+            dataset_data = orjson.loads(dataset_data)
+        except orjson.JSONDecodeError:
+            logger.warning("Dataset '%s' returned non-JSON data", dataset_name)
+            dataset_data = None
+    if not isinstance(dataset_data, list):
+        view = DatasetView()
+    elif len(dataset_data) >= CLASSIFY_IN_THREAD_MIN:
+        view = await asyncio.to_thread(classify_dataset, dataset_data)
+    else:
+        view = classify_dataset(dataset_data)
+    _cache[dataset_name] = (now + DATASET_CACHE_TTL, view)
+    return view
+
+
+def paginate(entries: List[Dict[str, str]], limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, str]]:
+    """Slice a classified list for one page (all remaining entries if no limit)."""
+    if limit is None:
+        return entries[offset:]
+    return entries[offset:offset + limit]
+
+
+def invalidate(dataset_name: str) -> None:
+    """Drop the cached view of a dataset after its contents change."""
+    _cache.pop(dataset_name, None)
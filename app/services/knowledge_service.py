@@ -1,5 +1,5 @@
 """Knowledge service for Agno agent integration with Cognee."""
-from typing import Optional
+import functools
 from app.services.cognee_service import get_cognee_service
 from app.config import settings
 
@@ -106,20 +106,15 @@ class KnowledgeService:
 
 
 # Global instance
-_knowledge_service: Optional[KnowledgeService] = None
-
-
+@functools.cache
 def get_knowledge_service() -> KnowledgeService:
     """Get or create Knowledge service instance.
     
     Note: This depends on CogneeService, so Cognee must be initialized first.
     """
-    global _knowledge_service
-    if _knowledge_service is None:
-        try:
-            _knowledge_service = KnowledgeService()
-        except Exception as e:
-            # Log error but don't fail silently
-            print(f"Warning: Failed to initialize Knowledge service: {str(e)}")
-            raise
-    return _knowledge_service
+    try:
+        return KnowledgeService()
+    except Exception as e:
+        # Log error but don't fail silently
+        print(f"Warning: Failed to initialize Knowledge service: {str(e)}")
+        raise
@@ -1,84 +1,303 @@
 """File handling utilities for uploads and previews."""
 import os
+import re
+import stat
+import functools
+import html
+import secrets
+import zipfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import aiofiles
 from fastapi import UploadFile
 from typing import Optional
-from pathlib import Path
 
 
 # Allowed file extensions
-ALLOWED_EXTENSIONS = {".pdf", ".docx", ".txt", ".md"}
+ALLOWED_EXTENSIONS = frozenset({".pdf", ".docx", ".txt", ".md"})
 
 # Upload directory
 UPLOADS_DIR = "app/static/uploads"
 
+# Read/write size when streaming uploads to disk (1 MiB)
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Characters shown in a preview before it's cut off with "..."
+PREVIEW_CHARS = 1000
+
+# DOCX previews read at most this much of word/document.xml (64 KiB)
+DOCX_PREVIEW_BYTES = 64 * 1024
+DOCX_PREVIEW_PARAGRAPHS = 10
+
+# Paragraphs (<w:p>...</w:p> or empty <w:p/>) and their text runs in document.xml
+_DOCX_PARAGRAPH_RE = re.compile(rb"<w:p(?:\s[^>]*?)?(?:/>|>(.*?)</w:p>)", re.S)
+# Run content: text, or an inner-content element python-docx turns into text
+_DOCX_TEXT_RE = re.compile(rb"<w:t(?:\s[^>]*)?>([^<]*)</w:t>|<w:(tab|ptab|br|cr|noBreakHyphen)(\s[^>]*)?/>")
+# Paragraph properties (their <w:tabs> hold tab stops, not tab characters)
+_DOCX_PARAGRAPH_PROPS_RE = re.compile(rb"<w:pPr(?:\s[^>]*)?>.*?</w:pPr>", re.S)
+# Table open/close tags; python-docx's doc.paragraphs skips table contents
+_DOCX_TABLE_TAG_RE = re.compile(rb"<(/?)w:tbl[\s>]")
+_DOCX_INNER_TEXT = {b"tab": "\t", b"ptab": "\t", b"cr": "\n", b"noBreakHyphen": "-"}
+
+# python-docx is only a fallback for documents the fast path can't read
+try:
+    from docx import Document
+except ImportError:
+    Document = None
+
+# The fallback parses the whole document (CPU-bound, holds the GIL), so it runs
+# in worker processes; the pool is created on first use
+DOCX_FALLBACK_WORKERS = 2
+_docx_pool: Optional[ProcessPoolExecutor] = None
+_docx_pool_lock = threading.Lock()
+
+def file_extension(filename: str) -> str:
+    """Lowercased extension of the last path component, with its dot ('' if none).
+    
+    Two string scans instead of building a Path or going through splitext.
+    """
+    dot = filename.rfind(".")
+    # No dot in the last component, or a dotfile like ".env"
+    if dot <= filename.rfind("/") + 1:
+        return ""
+    return filename[dot:].lower()
+
 
 def validate_file(filename: str) -> bool:
     """Validate file type."""
-    if not filename:
-        return False
-    
-    file_ext = Path(filename).suffix.lower()
-    return file_ext in ALLOWED_EXTENSIONS
+    return bool(filename) and file_extension(filename) in ALLOWED_EXTENSIONS
 
 
-async def save_uploaded_file(file: UploadFile) -> str:
-    """Save uploaded file to uploads directory."""
-    # Ensure uploads directory exists
+def ensure_uploads_dir() -> None:
+    """Create the uploads directory (called once at startup)."""
     os.makedirs(UPLOADS_DIR, exist_ok=True)
-    
+
+
+async def save_uploaded_file(file: UploadFile) -> str:
+    """Save uploaded file to uploads directory (created at startup)."""
     # Generate unique filename
-    file_ext = Path(file.filename).suffix.lower()
-    unique_filename = f"{os.urandom(16).hex()}{file_ext}"
+    file_ext = file_extension(file.filename)
+    unique_filename = f"{secrets.token_hex(16)}{file_ext}"
     file_path = os.path.join(UPLOADS_DIR, unique_filename)
     
-    # Save file
-    async with aiofiles.open(file_path, 'wb') as f:
-        content = await file.read()
-        await f.write(content)
+    # Stream to disk in fixed-size chunks so memory stays O(chunk), not O(file)
+    try:
+        async with aiofiles.open(file_path, 'wb') as f:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await f.write(chunk)
+    except BaseException:
+        # Don't leave a truncated file behind (e.g. client disconnected mid-upload)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    finally:
+        # Release the spooled copy now rather than after Cognee ingestion finishes
+        await file.close()
     
     return file_path
 
 
+def _uploaded_file_path(filename: str) -> Optional[str]:
+    """Path of a plain file name inside the uploads directory (None for anything else)."""
+    if not filename or filename in (".", "..") or os.path.basename(filename) != filename:
+        return None
+    return os.path.join(UPLOADS_DIR, filename)
+
+
+def find_uploaded_file(filename: str) -> Optional[str]:
+    """Get the path of a file in the uploads directory, or None if it isn't there."""
+    path = _uploaded_file_path(filename)
+    return path if path is not None and os.path.isfile(path) else None
+
+
+def get_uploaded_file_preview(filename: str) -> Optional[str]:
+    """Preview a file from the uploads directory (None if it isn't there).
+    
+    Does the lookup and the read together, so callers can run both in one
+    worker thread. A single stat() both checks the file and keys the cache.
+    """
+    path = _uploaded_file_path(filename)
+    if path is None:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    return _stat_preview(path, st)
+
+
+class _PreviewError(Exception):
+    """A preview that couldn't be built; its message is shown, but never cached."""
+
+
 def get_file_preview(file_path: str) -> str:
-    """Get preview of file content."""
-    file_ext = Path(file_path).suffix.lower()
+    """Get preview of file content (cached until the file changes)."""
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        # Let the uncached path produce its usual error message
+        try:
+            return _build_preview(file_path)
+        except _PreviewError as e:
+            return str(e)
+    return _stat_preview(file_path, st)
+
+
+def _stat_preview(file_path: str, st: os.stat_result) -> str:
+    """Preview of a file already stat()ed, cached by (path, mtime, size)."""
+    try:
+        return _cached_preview(file_path, st.st_mtime_ns, st.st_size)
+    except _PreviewError as e:
+        # Errors may be transient (e.g. a crashed worker) - retried next time
+        return str(e)
+
+
+@functools.lru_cache(maxsize=512)
+def _cached_preview(file_path: str, mtime_ns: int, size: int) -> str:
+    """Preview memoized by (path, mtime, size); a changed file gets a new key."""
+    return _build_preview(file_path)
+
+
+def _build_preview(file_path: str) -> str:
+    """Build the preview of a file (raises _PreviewError if it can't be read)."""
+    file_ext = file_extension(file_path)
     
     if file_ext == ".txt" or file_ext == ".md":
         # Read text file
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                # Return first 1000 characters
-                return content[:1000] + ("..." if len(content) > 1000 else "")
+                # One character past the limit tells whether there's more
+                return truncate_preview(f.read(PREVIEW_CHARS + 1))
         except Exception as e:
-            return f"Error reading file: {str(e)}"
+            raise _PreviewError(f"Error reading file: {str(e)}")
     
     elif file_ext == ".pdf":
         # PDF preview - return message indicating PDF viewer needed
         return "PDF file - use browser PDF viewer"
     
     elif file_ext == ".docx":
-        # DOCX preview - would need python-docx library
         try:
-            from docx import Document
-            doc = Document(file_path)
-            # Extract text from first few paragraphs
-            text = "\n".join([para.text for para in doc.paragraphs[:10]])
-            return text[:1000] + ("..." if len(text) > 1000 else "")
+            text = _docx_preview_text(file_path)
         except Exception as e:
-            return f"Error reading DOCX: {str(e)}"
+            if Document is None:
+                raise _PreviewError(f"Error reading DOCX: {str(e)}")
+            try:
+                text = _get_docx_pool().submit(_docx_fallback_text, file_path).result()
+            except BrokenProcessPool as e:
+                # A worker died; start a fresh pool on the next preview
+                shutdown_preview_pool()
+                raise _PreviewError(f"Error reading DOCX: {str(e)}")
+            except Exception as e:
+                raise _PreviewError(f"Error reading DOCX: {str(e)}")
+        return truncate_preview(text)
     
     else:
         return "Preview not available for this file type"
 
 
+def truncate_preview(text: str, limit: int = PREVIEW_CHARS) -> str:
+    """Cut text to the preview length, marking the cut with "..."."""
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def _docx_preview_text(file_path: str) -> str:
+    """Text of the first paragraphs of a DOCX, read straight from its XML.
+    
+    Only the head of word/document.xml is decompressed and scanned, instead
+    of parsing the whole document into a DOM.
+    """
+    with zipfile.ZipFile(file_path) as archive, archive.open("word/document.xml") as f:
+        data = f.read(DOCX_PREVIEW_BYTES)
+    
+    paragraphs = []
+    length = -1  # Joined length, counting the "\n" separators
+    for match in _DOCX_PARAGRAPH_RE.finditer(_strip_docx_tables(data)):
+        paragraph = _docx_paragraph_text(match.group(1) or b"")
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 1
+        # Stop once the preview is full; the caller truncates the overflow
+        if len(paragraphs) == DOCX_PREVIEW_PARAGRAPHS or length > PREVIEW_CHARS:
+            break
+    text = "\n".join(paragraphs)
+    if not text:
+        # No complete paragraph text in the head (large preamble or a huge first
+        # paragraph): raise so the caller falls back to python-docx
+        raise ValueError("No paragraph text in the first bytes of word/document.xml")
+    return text
+
+
+def _strip_docx_tables(data: bytes) -> bytes:
+    """document.xml without its (possibly nested) tables; an unclosed one runs to the end."""
+    kept = []
+    depth = 0
+    start = 0
+    for match in _DOCX_TABLE_TAG_RE.finditer(data):
+        if not match.group(1):
+            if depth == 0:
+                kept.append(data[start:match.start()])
+            depth += 1
+        elif depth:
+            depth -= 1
+            if depth == 0:
+                start = match.end()
+    if depth == 0:
+        kept.append(data[start:])
+    return b"".join(kept)
+
+
+def _docx_paragraph_text(xml: bytes) -> str:
+    """Text of one paragraph's XML, the way python-docx's Paragraph.text reads it."""
+    parts = []
+    for text, element, attributes in _DOCX_TEXT_RE.findall(_DOCX_PARAGRAPH_PROPS_RE.sub(b"", xml)):
+        if not element:
+            parts.append(html.unescape(text.decode("utf-8", "ignore")))
+        elif element == b"br":
+            # Line breaks become "\n"; page and column breaks add nothing
+            parts.append("" if b'w:type="page"' in attributes or b'w:type="column"' in attributes else "\n")
+        else:
+            parts.append(_DOCX_INNER_TEXT[element])
+    return "".join(parts)
+
+
+def _docx_fallback_text(file_path: str) -> str:
+    """Text of the first paragraphs of a DOCX via python-docx (runs in a worker process)."""
+    doc = Document(file_path)
+    # Extract text from first few paragraphs
+    return "\n".join([para.text for para in doc.paragraphs[:DOCX_PREVIEW_PARAGRAPHS]])
+
+
+def _get_docx_pool() -> ProcessPoolExecutor:
+    """The python-docx worker pool, created on first use."""
+    global _docx_pool
+    with _docx_pool_lock:
+        if _docx_pool is None:
+            # spawn: forking a process that runs threads can deadlock the child
+            _docx_pool = ProcessPoolExecutor(
+                max_workers=min(DOCX_FALLBACK_WORKERS, os.cpu_count() or 1),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _docx_pool
+
+
+def shutdown_preview_pool() -> None:
+    """Stop the python-docx worker processes, if any were started."""
+    global _docx_pool
+    with _docx_pool_lock:
+        pool, _docx_pool = _docx_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
 def extract_metadata(file_path: str) -> dict:
     """Extract metadata from file."""
     file_stat = os.stat(file_path)
     return {
         "filename": os.path.basename(file_path),
         "size": file_stat.st_size,
-        "extension": Path(file_path).suffix.lower(),
+        "extension": file_extension(file_path),
         "modified": file_stat.st_mtime
     }
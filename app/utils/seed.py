@@ -1,119 +1,207 @@
 """Database seeding script for initial admin user and database pruning."""
-from sqlalchemy.orm import Session
+from typing import Optional
+from sqlalchemy import select, update, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, load_only
 from app.database import SessionLocal, engine, Base
 from app.models import User
-from app.security.auth import get_password_hash, verify_password
 from app.config import settings
+import hashlib
+import hmac
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+# Set once create_all has run in this process
+_schema_ready = False
+
+# Marker of the last admin hash verified against the .env password, so an
+# unchanged admin doesn't pay for a bcrypt verify on every boot
+SEED_STATE_FILE = ".cognito_seed_state"
+
+# pg_advisory_xact_lock key held while the admin user is seeded
+SEED_LOCK_KEY = 4242424242
+
+
+def _seed_marker(hashed_password: str) -> str:
+    """Keyed digest of the .env admin credentials and the stored hash they match.
+    
+    HMAC with the app secret: the file can't be used to brute-force the
+    password offline, and it only matches while the row holds that hash.
+    """
+    message = f"{settings.admin_username}\0{settings.admin_password}\0{hashed_password}"
+    return hmac.new(settings.secret_key.encode(), message.encode(), hashlib.sha256).hexdigest()
+
+
+def _read_seed_marker() -> Optional[str]:
+    try:
+        with open(SEED_STATE_FILE) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _write_seed_marker(hashed_password: str) -> None:
+    try:
+        with open(SEED_STATE_FILE, "w") as f:
+            f.write(_seed_marker(hashed_password))
+    except OSError as e:
+        # Best effort - next boot just verifies again
+        logger.warning("Could not write seed state: %s", e)
+
+
+def _ensure_schema():
+    """Create tables if they don't exist (checked once per process)."""
+    global _schema_ready
+    if not _schema_ready:
+        Base.metadata.create_all(bind=engine)
+        _schema_ready = True
+
+
 def prune_database(db: Session):
-    """Clean up database - remove duplicate admin users, ensure data integrity."""
+    """Clean up database - ensure the admin user's data integrity.
+    
+    Duplicate admins can't exist: ix_users_username is a unique index, so the
+    storage engine enforces one row per username. What's left is a single
+    set-based UPDATE that is a no-op when the admin is already correct.
+    Changes are not committed; the caller owns the transaction.
+    """
     try:
-        # Find all users with admin username
-        admin_users = db.query(User).filter(User.username == settings.admin_username).all()
-        
-        if len(admin_users) > 1:
-            logger.warning(f"Found {len(admin_users)} admin users, keeping only the first one")
-            # Keep the first one, delete duplicates
-            for admin_user in admin_users[1:]:
-                db.delete(admin_user)
-            db.commit()
-            logger.info("Removed duplicate admin users")
-        
-        # Ensure all admin users have correct scopes
-        admin_users = db.query(User).filter(User.username == settings.admin_username).all()
-        for admin_user in admin_users:
-            if "admin" not in admin_user.scopes:
-                admin_user.scopes = ["admin"]
-                admin_user.is_active = True
-                db.commit()
-                logger.info(f"Updated admin user '{admin_user.username}' scopes to ['admin']")
+        # Ensure the admin user has correct scopes
+        fixed = db.execute(
+            update(User)
+            .where(User.username == settings.admin_username, ~User.scopes.contains(["admin"]))
+            .values(scopes=["admin"], is_active=True)
+        )
+        if fixed.rowcount:
+            logger.info("Updated admin user '%s' scopes to ['admin']", settings.admin_username)
         
         logger.info("Database pruning completed")
     except Exception as e:
-        db.rollback()
-        logger.error(f"Error during database pruning: {str(e)}")
+        logger.error("Error during database pruning: %s", e)
         raise
 
 
-def ensure_admin_user():
-    """Ensure admin user exists and matches .env configuration (upsert logic)."""
-    # Create tables if they don't exist
-    Base.metadata.create_all(bind=engine)
+def ensure_admin_user(db: Optional[Session] = None):
+    """Ensure admin user exists and matches .env configuration (upsert logic).
+    
+    With a session, the work joins the caller's transaction (the caller
+    commits); without one, a session is opened and committed here.
+    """
+    _ensure_schema()
+    
+    if db is not None:
+        _upsert_admin_user(db)
+        return
     
-    db: Session = SessionLocal()
     try:
-        # Prune database first
-        prune_database(db)
-        
-        # Check if admin user exists
-        admin_user = db.query(User).filter(User.username == settings.admin_username).first()
+        # begin() commits on success and rolls back on error
+        with SessionLocal() as db, db.begin():
+            _upsert_admin_user(db)
+    except Exception as e:
+        logger.error("Error ensuring admin user: %s", e)
+        raise
+
+
+def _upsert_admin_user(db: Session):
+    """Create or update the admin user (flushed, not committed).
+    
+    Covers everything prune_database fixes (scopes, is_active) from the same
+    row read, so the boot seed is one lock, one SELECT and at most one write.
+    """
+    # Imported here so prune-only callers never load passlib/bcrypt
+    from app.security.auth import get_password_hash, verify_and_update_password, password_hash_needs_update
+    
+    # Serialize concurrent seeders (e.g. several uvicorn workers booting at
+    # once); released automatically when the transaction ends
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SEED_LOCK_KEY})
+    
+    # Check if admin user exists (only the columns the upsert reads)
+    admin_user = db.scalars(
+        select(User)
+        .options(load_only(User.id, User.username, User.hashed_password, User.scopes, User.is_active))
+        .where(User.username == settings.admin_username)
+    ).first()
+    
+    if admin_user:
+        # Admin exists - check if password changed or settings don't match
+        upgraded_hash = None
+        marker_matched = False
+        try:
+            if (
+                hmac.compare_digest(_read_seed_marker() or "", _seed_marker(admin_user.hashed_password))
+                and not password_hash_needs_update(admin_user.hashed_password)
+            ):
+                # Same .env password and same stored hash as a previous verified run
+                marker_matched = True
+                password_changed = False
+            else:
+                # Verify current password against .env password (and get an upgraded
+                # hash if the stored one uses outdated parameters)
+                verified, upgraded_hash = verify_and_update_password(settings.admin_password, admin_user.hashed_password)
+                password_changed = not verified
+        except Exception as e:
+            # If verification fails (e.g., hash format issue), assume password needs update
+            logger.warning("Password verification failed, will update: %s", e)
+            password_changed = True
         
-        # Hash password from settings
-        hashed_password = get_password_hash(settings.admin_password)
+        # Compared once; the check below reuses the result
+        scopes_ok = admin_user.scopes == ["admin"]
+        needs_update = (
+            password_changed or
+            upgraded_hash is not None or
+            not scopes_ok or
+            not admin_user.is_active
+        )
         
-        if admin_user:
-            # Admin exists - check if password changed or settings don't match
-            password_changed = False
-            try:
-                # Try to verify current password against .env password
-                password_changed = not verify_password(settings.admin_password, admin_user.hashed_password)
-            except Exception as e:
-                # If verification fails (e.g., hash format issue), assume password needs update
-                logger.warning(f"Password verification failed, will update: {str(e)}")
-                password_changed = True
+        if needs_update:
+            if password_changed:
+                # Only pay the bcrypt cost when the password actually changed
+                admin_user.hashed_password = get_password_hash(settings.admin_password)
+                logger.info("Updated admin user '%s' password", settings.admin_username)
+            elif upgraded_hash is not None:
+                admin_user.hashed_password = upgraded_hash
+                logger.info("Upgraded admin user '%s' password hash", settings.admin_username)
             
-            needs_update = (
-                password_changed or
-                admin_user.scopes != ["admin"] or
-                not admin_user.is_active
-            )
+            if not scopes_ok:
+                admin_user.scopes = ["admin"]
+                logger.info("Updated admin user '%s' scopes to ['admin']", settings.admin_username)
             
-            if needs_update:
-                if password_changed:
-                    admin_user.hashed_password = hashed_password
-                    logger.info(f"Updated admin user '{settings.admin_username}' password")
-                
-                if admin_user.scopes != ["admin"]:
-                    admin_user.scopes = ["admin"]
-                    logger.info(f"Updated admin user '{settings.admin_username}' scopes to ['admin']")
-                
-                if not admin_user.is_active:
-                    admin_user.is_active = True
-                    logger.info(f"Activated admin user '{settings.admin_username}'")
-                
-                db.commit()
-                db.refresh(admin_user)
-                logger.info(f"Admin user '{settings.admin_username}' updated successfully")
-            else:
-                logger.info(f"Admin user '{settings.admin_username}' already exists and is up to date")
+            if not admin_user.is_active:
+                admin_user.is_active = True
+                logger.info("Activated admin user '%s'", settings.admin_username)
+            
+            db.flush()
+            logger.info("Admin user '%s' updated successfully", settings.admin_username)
         else:
-            # Create new admin user
-            admin_user = User(
+            logger.info("Admin user '%s' already exists and is up to date", settings.admin_username)
+        if needs_update or not marker_matched:
+            _write_seed_marker(admin_user.hashed_password)
+    else:
+        # Create new admin user. ON CONFLICT makes this safe when several workers
+        # boot at once: the losers of the race insert nothing instead of failing
+        hashed_password = get_password_hash(settings.admin_password)
+        created = db.execute(
+            pg_insert(User)
+            .values(
                 username=settings.admin_username,
                 hashed_password=hashed_password,
                 is_active=True,  # Admin is active by default
                 scopes=["admin"]  # Admin scope
             )
-            
-            db.add(admin_user)
-            db.commit()
-            db.refresh(admin_user)
-            
-            logger.info(f"Admin user '{settings.admin_username}' created successfully")
+            .on_conflict_do_nothing(index_elements=[User.username])
+        )
         
-        # Log admin user details (without password)
-        logger.info(f"Admin user details: username='{admin_user.username}', active={admin_user.is_active}, scopes={admin_user.scopes}")
-        
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Error ensuring admin user: {str(e)}")
-        raise
-    finally:
-        db.close()
+        if created.rowcount:
+            _write_seed_marker(hashed_password)
+            logger.info("Admin user '%s' created successfully", settings.admin_username)
+        else:
+            logger.info("Admin user '%s' was created concurrently", settings.admin_username)
+        return
+    
+    # Log admin user details (without password)
+    logger.info("Admin user details: username='%s', active=%s, scopes=%s", admin_user.username, admin_user.is_active, admin_user.scopes)
 
 
 def seed_admin_user():
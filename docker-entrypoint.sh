@@ -5,4 +5,4 @@ echo "Running database migrations..."
 alembic upgrade head || echo "Warning: Migration failed, continuing anyway..."
 
 echo "Starting application..."
-exec uvicorn app.main:app --host 0.0.0.0 --port 8000
+exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --loop uvloop --http httptools
@@ -1,47 +1,73 @@
-
-import requests
-import json
+import asyncio
+import sys
+import time
+import httpx
 
 BASE_URL = "http://localhost:8000"
 
-def test_auth():
-    print("Testing Authentication Flow...")
-    
-    # 1. Login
-    login_url = f"{BASE_URL}/api/auth/login"
-    payload = {
-        "username": "admin",
-        "password": "admin123"
-    }
-    
-    session = requests.Session()
-    response = session.post(login_url, json=payload)
-    
-    print(f"Login Status: {response.status_code}")
-    print(f"Login Response: {response.json()}")
-    print(f"Cookies after login: {session.cookies.get_dict()}")
-    
+# Parallel login + dashboard flows in the throughput check
+CONCURRENCY = 20
+
+payload = {
+    "username": "admin",
+    "password": "admin123"
+}
+
+
+async def login_and_hit(client: httpx.AsyncClient) -> tuple:
+    """One login + dashboard round; returns (login status, dashboard status)."""
+    response = await client.post("/api/auth/login", json=payload)
     if response.status_code != 200:
-        print("Login failed!")
-        return
-
-    # 2. Access Dashboard
-    dashboard_url = f"{BASE_URL}/dashboard"
-    response = session.get(dashboard_url)
-    
-    print(f"Dashboard Status: {response.status_code}")
-    if response.status_code == 200:
-        print("Dashboard access SUCCESSFUL!")
-    else:
-        print(f"Dashboard access FAILED with {response.status_code}")
-        # Try to see if there's any JSON detail
-        try:
-            print(f"Error Detail: {response.json()}")
-        except:
-            print("Response is not JSON (likely HTML redirect or error page)")
+        return response.status_code, None
+    response = await client.get("/dashboard")
+    return 200, response.status_code
+
+
+async def test_auth(concurrency: int = CONCURRENCY):
+    print("Testing Authentication Flow...")
+
+    # One keep-alive connection pool shared by every request. HTTP/1.1 on purpose:
+    # uvicorn doesn't serve HTTP/2, so http2=True would only fall back to it
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=BASE_URL, limits=limits, timeout=30) as client:
+        # 1. Login
+        response = await client.post("/api/auth/login", json=payload)
+
+        print(f"Login Status: {response.status_code}")
+        print(f"Login Response: {response.json()}")
+        print(f"Cookies after login: {dict(client.cookies)}")
+
+        if response.status_code != 200:
+            print("Login failed!")
+            return
+
+        # 2. Access Dashboard
+        response = await client.get("/dashboard")
+
+        print(f"Dashboard Status: {response.status_code}")
+        if response.status_code == 200:
+            print("Dashboard access SUCCESSFUL!")
+        else:
+            print(f"Dashboard access FAILED with {response.status_code}")
+            # Try to see if there's any JSON detail
+            try:
+                print(f"Error Detail: {response.json()}")
+            except ValueError:
+                print("Response is not JSON (likely HTML redirect or error page)")
+            return
+
+        # 3. Concurrent sessions - overlaps network round-trips and server-side bcrypt
+        start = time.perf_counter()
+        results = await asyncio.gather(*(login_and_hit(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+        ok = sum(1 for result in results if result == (200, 200))
+        print(f"Concurrent flows: {ok}/{concurrency} OK in {elapsed:.2f}s")
+        if ok != concurrency:
+            print(f"Failures (login, dashboard): {[result for result in results if result != (200, 200)]}")
 
 if __name__ == "__main__":
     try:
-        test_auth()
+        asyncio.run(test_auth(int(sys.argv[1]) if len(sys.argv) > 1 else CONCURRENCY))
     except Exception as e:
         print(f"An error occurred: {e}")